@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Compiled course catalog index.
+
+The raw departments/*.json dumps (written by ocw_parser.py) carry runs,
+instructors, prices, images and so on that the recommender never reads.
+`build_index` compiles them once into a small SQLite file holding only
+title, coursenum, best description, department and level; `load_department`
+then answers with a single indexed SELECT instead of a full json.load.
+
+Build (re-run after refreshing departments/); this also rebuilds the
+rank_index.py index for mode="rank" from the same dumps:
+    python catalog_index.py build
+"""
+
+import json
+import os
+import re
+import sys
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from typing import Callable, List, Dict, Optional
+
+from env_loader import getenv
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEPARTMENTS_DIR = os.path.join(HERE, "departments")
+
+
+def default_index_path() -> str:
+    """CATALOG_INDEX_PATH, read on use: the .env is loaded lazily, after import."""
+    return getenv("CATALOG_INDEX_PATH", os.path.join(HERE, "catalog_index.sqlite"))
+
+
+SCHEMA = """
+CREATE TABLE courses (
+    department  TEXT NOT NULL,
+    pos         INTEGER NOT NULL,
+    title       TEXT NOT NULL,
+    coursenum   TEXT,
+    description TEXT,
+    level       TEXT,
+    PRIMARY KEY (department, pos)
+) WITHOUT ROWID;
+CREATE TABLE sources (
+    department TEXT PRIMARY KEY,
+    mtime_ns   INTEGER NOT NULL,
+    size       INTEGER NOT NULL
+);
+"""
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"\s+")
+
+
+def _clean(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    return _WS_RE.sub(" ", _TAG_RE.sub(" ", text)).strip()
+
+
+def best_description(course: Dict) -> str:
+    """First non-empty description: course short/full, then each run's short/full."""
+    candidates = [course.get("short_description"), course.get("full_description")]
+    for run in course.get("runs") or []:
+        candidates.append(run.get("short_description"))
+        candidates.append(run.get("full_description"))
+    for text in candidates:
+        text = _clean(text)
+        if text:
+            return text
+    return ""
+
+
+def course_level(course: Dict) -> str:
+    """Levels across runs in first-seen order, e.g. "Undergraduate, Graduate"."""
+    levels = []
+    for run in course.get("runs") or []:
+        for lvl in run.get("level") or []:
+            if lvl and lvl not in levels:
+                levels.append(lvl)
+    return ", ".join(levels)
+
+
+def compact_course(course: Dict, department: str) -> Dict:
+    """
+    The subset of a raw OCW course the recommender uses. The description is
+    exposed as 'short_description' so callers written against the raw JSON
+    keep working.
+    """
+    return {
+        "title": course.get("title") or "No Title",
+        "coursenum": course.get("coursenum") or "",
+        "short_description": best_description(course),
+        "department": department,
+        "level": course_level(course),
+    }
+
+
+def _source_path(department: str) -> str:
+    return os.path.join(DEPARTMENTS_DIR, f"{department}.json")
+
+
+def build_index(departments_dir: str = None, index_path: str = None) -> Dict[str, int]:
+    """Compile every departments/*.json into the SQLite index. Returns {department: course_count}."""
+    departments_dir = departments_dir or DEPARTMENTS_DIR
+    index_path = index_path or default_index_path()
+    tmp_path = index_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    counts = {}
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        for fname in sorted(os.listdir(departments_dir)):
+            if not fname.endswith(".json"):
+                continue
+            department = fname[:-len(".json")]
+            path = os.path.join(departments_dir, fname)
+            st = os.stat(path)
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            rows = []
+            for pos, course in enumerate(raw):
+                c = compact_course(course, department)
+                rows.append((department, pos, c["title"], c["coursenum"],
+                             c["short_description"], c["level"]))
+            conn.executemany("INSERT INTO courses VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("INSERT INTO sources VALUES (?, ?, ?)", (department, st.st_mtime_ns, st.st_size))
+            counts[department] = len(rows)
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp_path, index_path)
+    _local.__dict__.clear()  # drop cached connections to the old file
+    return counts
+
+
+# One read-only connection per thread (sqlite3 connections are not shared)
+_local = threading.local()
+
+
+def _connection() -> Optional[sqlite3.Connection]:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        path = default_index_path()
+        if not os.path.exists(path):
+            return None
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        _local.conn = conn
+    return conn
+
+
+def _is_fresh(conn: sqlite3.Connection, department: str) -> bool:
+    row = conn.execute("SELECT mtime_ns, size FROM sources WHERE department = ?", (department,)).fetchone()
+    if row is None:
+        return False
+    try:
+        st = os.stat(_source_path(department))
+    except OSError:
+        return True  # JSON removed after the build; the index is all we have
+    return (st.st_mtime_ns, st.st_size) == tuple(row)
+
+
+def load_department(department: str) -> Optional[List[Dict]]:
+    """
+    Compact course dicts for `department` from the index, in file order.
+    Returns None when the index is missing or older than the department JSON,
+    so the caller can fall back to parsing the JSON itself.
+    """
+    conn = _connection()
+    if conn is None:
+        return None
+    try:
+        if not _is_fresh(conn, department):
+            logger.warning(f"Catalog index stale or missing {department}; run `python catalog_index.py build`")
+            return None
+        rows = conn.execute(
+            "SELECT title, coursenum, description, level FROM courses WHERE department = ? ORDER BY pos",
+            (department,)
+        ).fetchall()
+    except sqlite3.Error as e:
+        logger.warning(f"Catalog index unreadable: {e}")
+        return None
+    return [
+        {"title": t, "coursenum": n, "short_description": d, "department": department, "level": l}
+        for t, n, d, l in rows
+    ]
+
+
+def read_department(department: str) -> List[Dict]:
+    """Compact courses for `department` from the index, else parsed from its JSON; [] when missing."""
+    try:
+        courses = load_department(department)
+        if courses is not None:
+            return courses
+        path = _source_path(department)
+        if not os.path.exists(path):
+            logger.warning(f"Department file not found: {path}")
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return [compact_course(c, department) for c in json.load(f)]
+    except Exception as e:
+        logger.error(f"Error loading department {department}: {e}")
+        return []
+
+
+def departments() -> List[str]:
+    """Department names with a JSON file under departments/, sorted."""
+    try:
+        names = os.listdir(DEPARTMENTS_DIR)
+    except OSError:
+        return []
+    return sorted(n[:-5] for n in names if n.endswith(".json"))
+
+
+# ---------- in-process LRU of loaded departments ----------
+def _approx_bytes(courses: List[Dict]) -> int:
+    """Rough footprint of a compact course list (string payload + per-object overhead)."""
+    total = sys.getsizeof(courses)
+    for c in courses:
+        total += sys.getsizeof(c)
+        for v in c.values():
+            total += sys.getsizeof(v)
+    return total
+
+
+class DepartmentCache:
+    """
+    Bounded LRU of department course lists, keyed by department.
+
+    Each entry remembers the (mtime_ns, size) of its departments/*.json, so a
+    re-run of ocw_parser.py invalidates it on the next lookup. Entries are
+    evicted least-recently-used first once `max_bytes` is exceeded (default:
+    DEPARTMENT_CACHE_MAX_BYTES, read on use since the .env is loaded after
+    import). Cached lists are shared between callers and must be treated as
+    read-only.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()  # department -> (stamp, courses, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_bytes(self) -> int:
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return int(getenv("DEPARTMENT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+    @staticmethod
+    def _stamp(department: str):
+        try:
+            st = os.stat(_source_path(department))
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def get(self, department: str, loader: Callable[[str], List[Dict]]) -> List[Dict]:
+        stamp = self._stamp(department)
+        with self._lock:
+            entry = self._entries.get(department)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(department)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        courses = loader(department)
+        if not courses:
+            return courses  # don't pin failures; the file may show up later
+        nbytes = _approx_bytes(courses)
+        max_bytes = self.max_bytes
+
+        with self._lock:
+            old = self._entries.pop(department, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if nbytes <= max_bytes:
+                self._entries[department] = (stamp, courses, nbytes)
+                self._bytes += nbytes
+                while self._bytes > max_bytes:
+                    _, (_, _, freed) = self._entries.popitem(last=False)
+                    self._bytes -= freed
+                    self.evictions += 1
+        return courses
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+DEPARTMENT_CACHE = DepartmentCache()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("usage: python catalog_index.py build"); sys.exit(1)
+    counts = build_index()
+    print(f"Indexed {sum(counts.values())} courses from {len(counts)} departments -> {default_index_path()}")
+    import rank_index
+    from script import TOPIC_SYNONYMS, TERMS2TOPICS
+    n = rank_index.build_index(TOPIC_SYNONYMS, TERMS2TOPICS)
+    print(f"Indexed {n} courses -> {rank_index.default_index_path()}")
@@ -0,0 +1,109 @@
+# course_graph.py — compact prerequisite graph: integer node ids, deduplicated acyclic edges, layers
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PLACEHOLDER_DESCRIPTION = "Prerequisite course - description not available"
+
+
+def build_graph(nodes: Iterable[Tuple[str, Optional[str]]], edges: Iterable[Tuple[str, str]]) -> Dict:
+    """
+    One pass over (name, description) nodes and (prerequisite, dependent) edges.
+
+    Names get integer ids in first-seen order; an edge endpoint that was never
+    listed as a node becomes a placeholder node (a later real description
+    replaces the placeholder). Duplicate edges and self-loops are dropped, and
+    every edge that would close a cycle (a DFS back edge, in input order) is
+    removed. Returns:
+        {"nodes": [[name, description], ...],   # index = node id
+         "edges": [[src_id, dst_id], ...],      # prerequisite -> dependent
+         "order": [node ids, topological],
+         "depth": [longest prerequisite chain above each node],
+         "cycles_broken": number of edges removed to break cycles}
+    """
+    ids: Dict[str, int] = {}
+    names: List[str] = []
+    descriptions: List[str] = []
+
+    def node_id(name, description=None):
+        i = ids.get(name)
+        if i is None:
+            i = ids[name] = len(names)
+            names.append(name)
+            descriptions.append(description or PLACEHOLDER_DESCRIPTION)
+        elif description and descriptions[i] == PLACEHOLDER_DESCRIPTION:
+            descriptions[i] = description
+        return i
+
+    for name, description in nodes:
+        node_id(name, description)
+
+    pairs = {}  # (src, dst) -> None: deduplicated, in input order
+    for src, dst in edges:
+        s, d = node_id(src), node_id(dst)
+        if s != d:
+            pairs[(s, d)] = None
+    adjacency: List[List[int]] = [[] for _ in names]  # src -> [dst]
+    for s, d in pairs:
+        adjacency[s].append(d)
+
+    # Iterative DFS: drop back edges, collect post-order for the topological order
+    n = len(names)
+    state = [0] * n  # 0 new, 1 on stack, 2 done
+    post: List[int] = []
+    broken = 0
+    for root in range(n):
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, 0)]
+        while stack:
+            v, k = stack[-1]
+            children = adjacency[v]
+            if k < len(children):
+                stack[-1] = (v, k + 1)
+                w = children[k]
+                if state[w] == 1:
+                    children[k] = -1  # back edge: closes a cycle
+                    broken += 1
+                elif state[w] == 0:
+                    state[w] = 1
+                    stack.append((w, 0))
+            else:
+                state[v] = 2
+                post.append(v)
+                stack.pop()
+
+    order = post[::-1]
+    depth = [0] * n
+    out_edges = []
+    for v in order:
+        for w in adjacency[v]:
+            if w < 0:
+                continue
+            if depth[v] + 1 > depth[w]:
+                depth[w] = depth[v] + 1
+    for v in range(n):
+        out_edges.extend([v, w] for w in adjacency[v] if w >= 0)
+
+    return {
+        "nodes": [[names[i], descriptions[i]] for i in range(n)],
+        "edges": out_edges,
+        "order": order,
+        "depth": depth,
+        "cycles_broken": broken,
+    }
+
+
+def empty_graph() -> Dict:
+    """build_graph with no nodes: what a roadmap that found no courses returns."""
+    return build_graph((), ())
+
+
+def from_pairs(vertices: List, edges: List) -> Dict:
+    """build_graph over the [[name, description]] / [[prerequisite, dependent]] roadmap lists."""
+    return build_graph(((v[0], v[1]) for v in vertices), ((e[0], e[1]) for e in edges))
+
+
+def to_pairs(graph: Dict) -> Tuple[List, List]:
+    """Back to the name-based (vertices, edges) lists generate_course_roadmap returns."""
+    nodes = graph["nodes"]
+    return nodes, [[nodes[s][0], nodes[d][0]] for s, d in graph["edges"]]
@@ -0,0 +1,115 @@
+# course_lookup.py — resolve LLM-written course names to real catalog entries
+import re
+import threading
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+from course_search import STOPWORDS
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+# "6.006 Introduction to Algorithms", "18.06: Linear Algebra", "MAS.S62 - ..."
+_NUM_PREFIX_RE = re.compile(r"^\s*([A-Za-z]*\d*\.[0-9A-Za-z.]+)\s*[:\-–]?\s+(.*)$")
+
+FUZZY_MIN = 0.8  # below this similarity a name stays unresolved
+
+
+def normalize_title(title: str) -> str:
+    t = (title or "").lower().replace("&", " and ")
+    return _NON_ALNUM_RE.sub(" ", t).strip()
+
+
+def normalize_coursenum(num: str) -> str:
+    return (num or "").strip().upper()
+
+
+class CourseLookup:
+    """
+    Title / course-number index over one department's courses.
+
+    resolve(name) tries, in order: exact title, normalised title, course
+    number (alone or as a "6.006 Title" prefix), then a fuzzy match
+    (best of token-set Jaccard and difflib ratio over courses sharing a
+    token). Results are memoised per name.
+    """
+
+    def __init__(self, courses: List[Dict]):
+        self.courses = courses
+        self.by_title: Dict[str, Dict] = {}
+        self.by_norm: Dict[str, Dict] = {}
+        self.by_num: Dict[str, Dict] = {}
+        self.postings: Dict[str, List[int]] = {}
+        self._norms: List[str] = []
+        for i, c in enumerate(courses):
+            title = c.get("title", "")
+            norm = normalize_title(title)
+            self._norms.append(norm)
+            self.by_title.setdefault(title, c)  # first one wins, as the old linear scan did
+            self.by_norm.setdefault(norm, c)
+            num = normalize_coursenum(c.get("coursenum"))
+            if num:
+                self.by_num.setdefault(num, c)
+            for tok in set(norm.split()):
+                self.postings.setdefault(tok, []).append(i)
+        self._memo: Dict[str, Optional[Dict]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            if name in self._memo:
+                return self._memo[name]
+        found = self._resolve(name)
+        with self._lock:
+            self._memo[name] = found
+        return found
+
+    def _resolve(self, name: str) -> Optional[Dict]:
+        if not name:
+            return None
+        hit = self.by_title.get(name) or self.by_norm.get(normalize_title(name))
+        if hit:
+            return hit
+        hit = self.by_num.get(normalize_coursenum(name))
+        if hit:
+            return hit
+        m = _NUM_PREFIX_RE.match(name)
+        if m:
+            hit = self.by_num.get(normalize_coursenum(m.group(1))) or self.by_norm.get(normalize_title(m.group(2)))
+            if hit:
+                return hit
+            name = m.group(2)
+        return self._fuzzy(normalize_title(name))
+
+    def _fuzzy(self, norm: str) -> Optional[Dict]:
+        tokens = set(norm.split())
+        # "introduction", "to", ... would make every course a candidate
+        keys = (tokens - STOPWORDS) or tokens
+        candidates = {i for tok in keys for i in self.postings.get(tok, ())}
+        best, best_score = None, FUZZY_MIN
+        matcher = SequenceMatcher(None, b=norm)
+        for i in sorted(candidates):
+            other = self._norms[i]
+            other_tokens = set(other.split())
+            score = len(tokens & other_tokens) / len(tokens | other_tokens)
+            matcher.set_seq1(other)
+            if score < best_score and matcher.quick_ratio() >= best_score:
+                score = max(score, matcher.ratio())
+            if score >= best_score and (best is None or score > best_score):
+                best, best_score = self.courses[i], score
+        return best
+
+
+# Same lifetime rule as course_search: reuse a lookup for as long as
+# DEPARTMENT_CACHE hands back the same course list.
+_lookups: Dict[str, CourseLookup] = {}
+_lock = threading.Lock()
+
+
+def department_lookup(department: str, courses: List[Dict]) -> CourseLookup:
+    with _lock:
+        lookup = _lookups.get(department)
+        if lookup is not None and lookup.courses is courses:
+            return lookup
+    lookup = CourseLookup(courses)
+    with _lock:
+        _lookups[department] = lookup
+    return lookup
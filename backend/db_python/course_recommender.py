@@ -1,9 +1,18 @@
-import anthropic
 import json
-import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional
 import time
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+import catalog_index
+import course_search
+import course_lookup
+import course_graph
+import prereq_graph
+from env_loader import getenv
+from llm_cache import LLM_CACHE
+from llm_usage import LLM_USAGE
+from single_flight import FLIGHTS
 
 # Set up logging and suppress HTTP request logs
 logging.basicConfig(level=logging.INFO)
@@ -14,8 +23,28 @@ logger.setLevel(logging.WARNING)
 
 
 class CourseRecommendationSystem:
+    # Settings are read from the .env on use (it is loaded lazily, after import)
+    @property
+    def max_concurrency(self) -> int:
+        """Cap on concurrent per-department Claude calls (keeps us within rate limits)."""
+        return int(getenv("COURSE_SELECTION_CONCURRENCY", "3"))
+
+    @property
+    def prefilter_top_n(self) -> int:
+        """Courses per department shown to Claude, picked by local BM25 relevance."""
+        return int(getenv("COURSE_PREFILTER_TOP_N", "50"))
+
+    @property
+    def prompt_cache(self) -> bool:
+        """
+        Send the static part of each prompt (a department's full course listing +
+        rules) as an Anthropic prompt-cache prefix; PROMPT_CACHE=0 disables.
+        """
+        return getenv("PROMPT_CACHE", "1") != "0"
+
     def __init__(self, api_key: str):
         """Initialize the course recommendation system with Claude API key."""
+        import anthropic  # deferred: only needed once a client is actually built
         self.client = anthropic.Anthropic(api_key=api_key)
         self.model = "claude-3-haiku-20240307"
 
@@ -61,17 +90,74 @@ class CourseRecommendationSystem:
             "Women's_and_Gender_Studies": 61
         }
 
-    def _call_claude_api(self, prompt: str, max_retries: int = 3) -> Optional[str]:
-        """Make API call to Claude with retry logic and error handling."""
+    def _cached_prompt(self, prefix: str, suffix: str):
+        """
+        (prefix, suffix) when the prefix is long enough for Anthropic to cache
+        it (PROMPT_CACHE_MIN_TOKENS: 2048 for Haiku, 1024 for Sonnet/Opus;
+        estimated at 4 characters a token), else the plain prompt: a shorter
+        prefix marked for caching would be ignored by the API.
+        """
+        min_tokens = int(getenv("PROMPT_CACHE_MIN_TOKENS", "2048"))
+        if self.prompt_cache and len(prefix) >= 4 * min_tokens:
+            return prefix, suffix
+        return f"{prefix}\n\n{suffix}"
+
+    def _request_kwargs(self, prompt) -> Dict:
+        """
+        messages.create kwargs. `prompt` is a plain string or a (prefix, suffix)
+        pair from _cached_prompt: the prefix, identical for every student, goes
+        first as a system block marked for prompt caching and the suffix is the
+        user message.
+        """
+        kwargs = dict(model=self.model, max_tokens=4000, temperature=0.1)
+        if isinstance(prompt, tuple):
+            prefix, prompt = prompt
+            kwargs["system"] = [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}]
+        kwargs["messages"] = [{"role": "user", "content": prompt}]
+        return kwargs
+
+    def _call_claude_api(self, prompt, max_retries: int = 3, cache: bool = True,
+                         label: str = "claude", parse: Optional[Callable[[str], Any]] = None) -> Optional[str]:
+        """
+        Make API call to Claude with retry logic and error handling (answers may
+        come from the LLM cache). Token and prompt-cache usage of each call is
+        recorded in LLM_USAGE under `label`. With `parse`, only answers it
+        accepts without raising are stored in the LLM cache. cache=False
+        always makes its own request (no cache, no sharing an in-flight one).
+        """
+        kwargs = self._request_kwargs(prompt)
+        key = LLM_CACHE.key(**kwargs)
+        if not cache:
+            return self._request_claude(key, kwargs, max_retries, cache, label, parse)
+        # Identical prompts already in flight share that call instead of starting another
+        return FLIGHTS.do(("claude", key),
+                          lambda: self._request_claude(key, kwargs, max_retries, cache, label, parse))
+
+    @staticmethod
+    def _cache_answer(key: str, text: str, parse: Optional[Callable[[str], Any]]):
+        """Store `text` in the LLM cache unless `parse` rejects it (a truncated or malformed answer)."""
+        if parse is not None:
+            try:
+                parse(text)
+            except Exception as e:
+                logger.warning(f"Not caching an answer that does not parse: {e}")
+                return
+        LLM_CACHE.put(key, text)
+
+    def _request_claude(self, key: str, kwargs: Dict, max_retries: int, cache: bool, label: str,
+                        parse: Optional[Callable[[str], Any]] = None) -> Optional[str]:
+        cached = LLM_CACHE.get(key) if cache else None
+        if cached is not None:
+            return cached
         for attempt in range(max_retries):
             try:
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=4000,
-                    temperature=0.1,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                return message.content[0].text
+                started = time.perf_counter()
+                message = self.client.messages.create(**kwargs)
+                self._record_usage(label, message, started)
+                text = message.content[0].text
+                if cache:
+                    self._cache_answer(key, text, parse)
+                return text
             except Exception as e:
                 logger.warning(f"API call attempt {attempt + 1} failed: {str(e)}")
                 if attempt < max_retries - 1:
@@ -81,6 +167,46 @@ class CourseRecommendationSystem:
                     return None
         return None
 
+    async def _acall_claude_api(self, prompt, max_retries: int = 3, cache: bool = True,
+                                label: str = "claude", parse: Optional[Callable[[str], Any]] = None) -> Optional[str]:
+        """Async twin of _call_claude_api, using self.async_client (an AsyncAnthropic)."""
+        kwargs = self._request_kwargs(prompt)
+        key = LLM_CACHE.key(**kwargs)
+        if not cache:
+            return await self._arequest_claude(key, kwargs, max_retries, cache, label, parse)
+        return await FLIGHTS.ado(("claude", key),
+                                 lambda: self._arequest_claude(key, kwargs, max_retries, cache, label, parse))
+
+    async def _arequest_claude(self, key: str, kwargs: Dict, max_retries: int, cache: bool,
+                               label: str, parse: Optional[Callable[[str], Any]] = None) -> Optional[str]:
+        cached = LLM_CACHE.get(key) if cache else None
+        if cached is not None:
+            return cached
+        for attempt in range(max_retries):
+            try:
+                started = time.perf_counter()
+                message = await self.async_client.messages.create(**kwargs)
+                self._record_usage(label, message, started)
+                text = message.content[0].text
+                if cache:
+                    self._cache_answer(key, text, parse)
+                return text
+            except Exception as e:
+                logger.warning(f"API call attempt {attempt + 1} failed: {str(e)}")
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(2 ** attempt)  # Exponential backoff
+                else:
+                    logger.error(f"All API call attempts failed: {str(e)}")
+                    return None
+        return None
+
+    @staticmethod
+    def _record_usage(label: str, message, started: float):
+        call = LLM_USAGE.record(label, getattr(message, "usage", None), time.perf_counter() - started)
+        logger.info(f"{label}: {call['input_tokens']} in / {call['output_tokens']} out tokens, "
+                    f"cache write {call['cache_creation_input_tokens']}, read {call['cache_read_input_tokens']}, "
+                    f"{call['seconds']}s")
+
     def select_departments(self, advisor_description: str, conversation_transcript: str,
                            skill_levels: List[List[str]]) -> List[str]:
         """
@@ -94,6 +220,22 @@ class CourseRecommendationSystem:
         Returns:
             List of selected department names (1-3 departments)
         """
+        prompt = self._department_selection_prompt(advisor_description, conversation_transcript, skill_levels)
+
+        try:
+            response = self._call_claude_api(prompt, label="departments", parse=self._department_array)
+            return self._parse_department_selection(response)
+
+        except Exception as e:
+            logger.error(f"Error in select_departments: {str(e)}")
+            return []
+
+    def _department_selection_prompt(self, advisor_description: str, conversation_transcript: str,
+                                     skill_levels: List[List[str]]):
+        """
+        Prompt asking Claude to choose 1-3 departments for the student profile
+        (see _cached_prompt; the department list alone is too short to cache).
+        """
         # Format skill levels for the prompt
         skills_text = "\n".join([f"- {skill[0]}: {skill[1]}" for skill in skill_levels])
 
@@ -101,15 +243,7 @@ class CourseRecommendationSystem:
         departments_text = "\n".join(
             [f"- {dept}: {count} courses" for dept, count in self.available_departments.items()])
 
-        prompt = f"""You are an expert academic advisor analyzing student profiles to recommend university departments from MIT.
-
-STUDENT PROFILE:
-Advisor Assessment: {advisor_description}
-
-Conversation Context: {conversation_transcript}
-
-Current Skills and Levels:
-{skills_text}
+        prefix = f"""You are an expert academic advisor analyzing student profiles to recommend university departments from MIT.
 
 AVAILABLE DEPARTMENTS:
 {departments_text}
@@ -126,50 +260,63 @@ CRITICAL SELECTION RULES:
 
 RESPONSE FORMAT:
 Return ONLY a JSON array of department names, for example:
-["Mathematics", "Physics", "Electrical_Engineering_and_Computer_Science"]
+["Mathematics", "Physics", "Electrical_Engineering_and_Computer_Science"]"""
 
-Analyze the student profile and select the most appropriate departments."""
+        suffix = f"""STUDENT PROFILE:
+Advisor Assessment: {advisor_description}
 
-        try:
-            response = self._call_claude_api(prompt)
-            if response:
-                # Extract JSON from response
-                import re
-                json_match = re.search(r'\[.*?\]', response, re.DOTALL)
-                if json_match:
-                    departments = json.loads(json_match.group())
-                    # Validate departments exist
-                    valid_departments = [dept for dept in departments if dept in self.available_departments]
-                    logger.info(f"Selected departments: {valid_departments}")
-                    return valid_departments[:3]  # Ensure max 3 departments
-
-            logger.error("Failed to parse department selection from Claude response")
-            return []
+Conversation Context: {conversation_transcript}
 
-        except Exception as e:
-            logger.error(f"Error in select_departments: {str(e)}")
-            return []
+Current Skills and Levels:
+{skills_text}
+
+Analyze the student profile and select the most appropriate departments."""
+        return self._cached_prompt(prefix, suffix)
+
+    @staticmethod
+    def _department_array(response: str) -> List:
+        """The JSON array in a department-selection answer; raises ValueError if there is none."""
+        import re
+        json_match = re.search(r'\[.*?\]', response, re.DOTALL)
+        if not json_match:
+            raise ValueError("no JSON array in department selection")
+        departments = json.loads(json_match.group())
+        if not isinstance(departments, list):
+            raise ValueError("department selection is not a list")
+        return departments
+
+    def _parse_department_selection(self, response: Optional[str]) -> List[str]:
+        """Pull the JSON array of department names out of a Claude response (max 3, validated)."""
+        if response:
+            try:
+                departments = self._department_array(response)
+            except ValueError:
+                departments = None
+            if departments is not None:
+                # Validate departments exist
+                valid_departments = [dept for dept in departments if dept in self.available_departments]
+                logger.info(f"Selected departments: {valid_departments}")
+                return valid_departments[:3]  # Ensure max 3 departments
+
+        logger.error("Failed to parse department selection from Claude response")
+        return []
 
     def _load_department_courses(self, department: str) -> List[Dict]:
-        """Load courses from department JSON file."""
-        try:
-            file_path = f"departments/{department}.json"
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    courses = json.load(f)
-                    return courses
-            else:
-                logger.warning(f"Department file not found: {file_path}")
-                return []
-        except Exception as e:
-            logger.error(f"Error loading department {department}: {str(e)}")
-            return []
+        """Load courses for a department through the in-process cache (read-only list)."""
+        return catalog_index.DEPARTMENT_CACHE.get(department, self._read_department_courses)
+
+    def _read_department_courses(self, department: str) -> List[Dict]:
+        """Load courses for a department from the compiled catalog index, or its JSON file."""
+        return catalog_index.read_department(department)
 
     def select_courses_with_prerequisites(self, selected_departments: List[str], advisor_description: str,
                                           conversation_transcript: str, skill_levels: List[List[str]]) -> List[Dict]:
         """
         Function 2: Select specific courses from chosen departments and identify prerequisites.
 
+        The per-department LLM calls are independent, so they run concurrently
+        (at most `max_concurrency` at a time); results are merged in department order.
+
         Args:
             selected_departments: Output from select_departments function
             advisor_description: Same as Function 1
@@ -179,37 +326,39 @@ Analyze the student profile and select the most appropriate departments."""
         Returns:
             List of course objects with prerequisites
         """
-        all_selected_courses = []
-
         # Format skill levels for prompt
         skills_text = "\n".join([f"- {skill[0]}: {skill[1]}" for skill in skill_levels])
 
-        for department in selected_departments:
-            # Load courses from department
-            department_courses = self._load_department_courses(department)
-            if not department_courses:
-                continue
-
-            # Prepare course list for Claude (title and short description)
-            courses_text = "\n".join([
-                f"- {course.get('title', 'No Title')}: {course.get('short_description', 'No Description')}"
-                for course in department_courses[:50]  # Limit to avoid token limits
-            ])
-
-            prompt = f"""You are selecting specific courses from {department} department for a student based on their profile.
+        def run(department):
+            return self._select_courses_for_department(
+                department, advisor_description, conversation_transcript, skills_text)
 
-            STUDENT PROFILE:
-            Advisor Assessment: {advisor_description}
-
-            Conversation Context: {conversation_transcript}
+        workers = max(1, min(self.max_concurrency, len(selected_departments)))
+        if workers == 1:
+            per_department = [run(d) for d in selected_departments]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                per_department = list(pool.map(run, selected_departments))
 
-            Current Skills and Levels:
-            {skills_text}
+        all_selected_courses = [course for courses in per_department for course in courses]
+        logger.info(f"Total selected courses with prerequisites: {len(all_selected_courses)}")
+        return all_selected_courses
 
-            AVAILABLE COURSES IN {department}:
-            {courses_text}
+    def _course_selection_prompt(self, department: str, department_courses: List[Dict], advisor_description: str,
+                                 conversation_transcript: str, skills_text: str):
+        """
+        Prompt asking Claude to pick courses (with prerequisites) from one
+        department. Only the student's BM25 top `prefilter_top_n` are offered.
+        With prompt caching the department's full listing (numbered titles)
+        and the rules form a prefix shared by every student, and the suffix
+        names the shortlist by number; a department too small to cache gets
+        the plain prompt with the shortlist written out.
+        """
+        query = "\n".join([advisor_description, conversation_transcript, skills_text])
+        shortlist = course_search.top_positions(department, department_courses, query, self.prefilter_top_n)
 
-            SELECTION REQUIREMENTS:
+        header = f"You are selecting specific courses from {department} department for a student based on their profile."
+        rules = """            SELECTION REQUIREMENTS:
             1. Select courses that closely match student interests and goals
             2. Consider skill level for difficulty appropriateness
             3. For each selected course, identify ALL necessary prerequisites based on student's current skill level
@@ -239,71 +388,211 @@ RESPONSE FORMAT:
 
             Return format: JSON array of course objects with course_title, course_description, department, and prerequisites fields.
 
-            IMPORTANT: Return ONLY the JSON array, nothing else. No explanations.
+            IMPORTANT: Return ONLY the JSON array, nothing else. No explanations."""
+        profile = f"""STUDENT PROFILE:
+            Advisor Assessment: {advisor_description}
+
+            Conversation Context: {conversation_transcript}
+
+            Current Skills and Levels:
+            {skills_text}
 
             Select appropriate courses with complete prerequisite chains for this student."""
 
-            try:
-                response = self._call_claude_api(prompt)
-                if response:
-                    import re
-
-                    # Find the complete JSON array using bracket counting
-                    start_idx = response.find('[')
-                    if start_idx != -1:
-                        bracket_count = 0
-                        end_idx = start_idx
-
-                        for i, char in enumerate(response[start_idx:], start_idx):
-                            if char == '[':
-                                bracket_count += 1
-                            elif char == ']':
-                                bracket_count -= 1
-                                if bracket_count == 0:
-                                    end_idx = i + 1
-                                    break
-
-                        json_str = response[start_idx:end_idx]
-
-                        # Clean the JSON string
-                        json_str = json_str.replace('\n', ' ').replace('\r', ' ')
-                        json_str = re.sub(r'\s+', ' ', json_str)  # Multiple spaces to single
-
-                        try:
-                            courses = json.loads(json_str)
-                            if isinstance(courses, list):
-                                all_selected_courses.extend(courses)
-                                logger.info(f"Selected {len(courses)} courses from {department}")
-                                if isinstance(courses, list):
-                                    # Enrich courses with original descriptions from department_courses
-                                    for course in courses:
-                                        course_title = course.get('course_title', '')
-                                        # Find original course in department_courses
-                                        for original_course in department_courses:
-                                            if original_course.get('title', '') == course_title:
-                                                course['original_description'] = original_course.get(
-                                                    'short_description', 'No description')
-                                                break
-
-                                    all_selected_courses.extend(courses)
-                                    logger.info(f"Selected {len(courses)} courses from {department}")
-                            else:
-                                logger.error(f"Invalid JSON structure from {department}")
-                        except json.JSONDecodeError as je:
-                            logger.error(f"JSON decode error for {department}: {str(je)}")
-                            logger.error(f"Problematic JSON: {json_str}")
-                    else:
-                        logger.error(f"No JSON array found in response for {department}")
-                        logger.error(f"Full response: {response}")
+        if self.prompt_cache:
+            listing = "\n".join(f"[{i}] {course.get('title', 'No Title')}"
+                                for i, course in enumerate(department_courses, 1))
+            prompt = self._cached_prompt(
+                f"""{header}
 
-            except Exception as e:
-                logger.error(f"Error selecting courses from {department}: {str(e)}")
+            ALL COURSES IN {department}:
+{listing}
+
+{rules}""",
+                f"""SHORTLIST: select courses only from these numbers (most relevant first); prerequisites may be any course in the listing. Answer with course titles, not numbers.
+            {", ".join(str(i + 1) for i in shortlist)}
+
+            {profile}""")
+            if isinstance(prompt, tuple):
+                return prompt
+
+        courses_text = "\n".join([
+            f"- {department_courses[i].get('title', 'No Title')}: {department_courses[i].get('short_description', 'No Description')}"
+            for i in shortlist
+        ])
+        return f"""{header}
+
+            AVAILABLE COURSES IN {department}:
+            {courses_text}
 
+{rules}
 
+            {profile}"""
 
+    @staticmethod
+    def _course_array(response: str) -> List:
+        """The JSON array of courses in a course-selection answer; raises ValueError if it is missing or malformed."""
+        import re
+
+        # Find the complete JSON array using bracket counting
+        start_idx = response.find('[')
+        if start_idx == -1:
+            raise ValueError(f"No JSON array found in response: {response}")
+
+        bracket_count = 0
+        end_idx = start_idx
+        for i, char in enumerate(response[start_idx:], start_idx):
+            if char == '[':
+                bracket_count += 1
+            elif char == ']':
+                bracket_count -= 1
+                if bracket_count == 0:
+                    end_idx = i + 1
+                    break
+
+        json_str = response[start_idx:end_idx]
+
+        # Clean the JSON string
+        json_str = json_str.replace('\n', ' ').replace('\r', ' ')
+        json_str = re.sub(r'\s+', ' ', json_str)  # Multiple spaces to single
+
+        try:
+            courses = json.loads(json_str)
+        except json.JSONDecodeError as je:
+            raise ValueError(f"JSON decode error: {str(je)}; problematic JSON: {json_str}")
+        if not isinstance(courses, list):
+            raise ValueError("Invalid JSON structure")
+        return courses
+
+    def _parse_course_selection(self, department: str, response: str, department_courses: List[Dict]) -> List[Dict]:
+        """Extract the JSON array of courses from a Claude response and enrich it with catalog descriptions."""
+        try:
+            courses = self._course_array(response)
+        except ValueError as e:
+            logger.error(f"Could not parse course selection for {department}: {e}")
+            return []
+
+        # Resolve titles and prerequisites to real catalog entries (title/number
+        # index with a fuzzy fallback) and attach their original descriptions
+        lookup = course_lookup.department_lookup(department, department_courses)
+        graph = prereq_graph.load_graph()
+        for course in courses:
+            original_course = lookup.resolve(course.get('course_title', ''))
+            if original_course:
+                course['course_title'] = original_course.get('title', '')
+                course['original_description'] = original_course.get(
+                    'short_description', 'No description')
+
+            prerequisites = course.get('prerequisites') or []
+            if isinstance(prerequisites, str):
+                prerequisites = [prerequisites]
+            if original_course and graph:
+                # Edges verified from the catalog itself, in case the model left them out
+                prerequisites = list(prerequisites) + [
+                    p['title'] for p in graph.prerequisites(original_course.get('coursenum'))]
+            resolved, descriptions = [], {}
+            for prereq in prerequisites:
+                original_prereq = lookup.resolve(prereq)
+                if original_prereq:
+                    prereq = original_prereq.get('title', prereq)
+                    if original_prereq.get('short_description'):
+                        descriptions[prereq] = original_prereq['short_description']
+                resolved.append(prereq)
+            course['prerequisites'] = list(dict.fromkeys(resolved))
+            if descriptions:
+                course['prerequisite_descriptions'] = descriptions
+
+        logger.info(f"Selected {len(courses)} courses from {department}")
+        return courses
+
+    def _select_courses_for_department(self, department: str, advisor_description: str,
+                                       conversation_transcript: str, skills_text: str) -> List[Dict]:
+        """One department's share of select_courses_with_prerequisites (safe to run in a worker thread)."""
+        try:
+            # Load courses from department
+            department_courses = self._load_department_courses(department)
+            if not department_courses:
+                return []
+
+            prompt = self._course_selection_prompt(
+                department, department_courses, advisor_description, conversation_transcript, skills_text)
+            response = self._call_claude_api(prompt, label=f"courses:{department}", parse=self._course_array)
+            if not response:
+                return []
+            return self._parse_course_selection(department, response, department_courses)
+
+        except Exception as e:
+            logger.error(f"Error selecting courses from {department}: {str(e)}")
+            return []
+
+    # ---------- async pipeline (one shared AsyncAnthropic client) ----------
+    async def aselect_departments(self, advisor_description: str, conversation_transcript: str,
+                                  skill_levels: List[List[str]]) -> List[str]:
+        """Async version of select_departments."""
+        prompt = self._department_selection_prompt(advisor_description, conversation_transcript, skill_levels)
+        try:
+            response = await self._acall_claude_api(prompt, label="departments", parse=self._department_array)
+            return self._parse_department_selection(response)
+        except Exception as e:
+            logger.error(f"Error in select_departments: {str(e)}")
+            return []
+
+    async def aselect_courses_with_prerequisites(self, selected_departments: List[str], advisor_description: str,
+                                                 conversation_transcript: str, skill_levels: List[List[str]],
+                                                 timeout: Optional[float] = None,
+                                                 on_department: Optional[Callable[[str, List[Dict]], None]] = None
+                                                 ) -> List[Dict]:
+        """
+        Async version of select_courses_with_prerequisites (same concurrency cap,
+        same merge order). A department still running after `timeout` seconds is
+        dropped, so the departments that did finish are still returned.
+        on_department(department, courses) is called as each department finishes.
+        """
+        skills_text = "\n".join([f"- {skill[0]}: {skill[1]}" for skill in skill_levels])
+        limit = asyncio.Semaphore(max(1, self.max_concurrency))
+
+        async def select(department):
+            async with limit:
+                return await self._aselect_courses_for_department(
+                    department, advisor_description, conversation_transcript, skills_text)
+
+        async def run(department):
+            try:
+                courses = await asyncio.wait_for(select(department), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Course selection for {department} exceeded {timeout}s; skipping")
+                courses = []
+            if on_department:
+                on_department(department, courses)
+            return courses
+
+        per_department = await asyncio.gather(*(run(d) for d in selected_departments))
+        all_selected_courses = [course for courses in per_department for course in courses]
         logger.info(f"Total selected courses with prerequisites: {len(all_selected_courses)}")
         return all_selected_courses
 
+    async def _aselect_courses_for_department(self, department: str, advisor_description: str,
+                                              conversation_transcript: str, skills_text: str) -> List[Dict]:
+        try:
+            # Catalog reads (SQLite / JSON), BM25 and prerequisite lookups block,
+            # so they run in a thread and the loop keeps serving other stages
+            department_courses = await asyncio.to_thread(self._load_department_courses, department)
+            if not department_courses:
+                return []
+
+            prompt = await asyncio.to_thread(
+                self._course_selection_prompt,
+                department, department_courses, advisor_description, conversation_transcript, skills_text)
+            response = await self._acall_claude_api(prompt, label=f"courses:{department}",
+                                                 parse=self._course_array)
+            if not response:
+                return []
+            return await asyncio.to_thread(self._parse_course_selection, department, response, department_courses)
+
+        except Exception as e:
+            logger.error(f"Error selecting courses from {department}: {str(e)}")
+            return []
+
     def create_learning_roadmap(self, courses_with_prereqs: List[Dict], student_profile: Dict = None) -> List:
         """
         Function 3: Create a graph representation from courses and prerequisites.
@@ -317,63 +606,129 @@ RESPONSE FORMAT:
             vertices: List of [course_name, original_course_description] pairs
             edges: List of [prerequisite_course, dependent_course] pairs
         """
+        graph = self.create_learning_graph(courses_with_prereqs)
+        if graph is None:
+            return [[], []]
+        vertices, edges = course_graph.to_pairs(graph)
+        return [vertices, edges]
+
+    def create_learning_graph(self, courses_with_prereqs: List[Dict]) -> Optional[Dict]:
+        """
+        create_learning_roadmap as a compact course_graph dict: integer node ids,
+        deduplicated edges with prerequisite cycles broken, topological order and
+        depth per node. None when there are no courses.
+        """
         if not courses_with_prereqs:
             logger.error("No courses provided for graph creation")
-            return [[], []]
+            return None
+
+        def nodes():
+            # Selected courses first (their descriptions win), then prerequisites
+            for course in courses_with_prereqs:
+                original_desc = course.get('original_description', '')
+                if not original_desc:
+                    original_desc = course.get('course_description', '')
+                if not original_desc or original_desc == 'No description':
+                    original_desc = 'No description available'
+                yield course.get('course_title', 'Unknown'), original_desc
+            for course in courses_with_prereqs:
+                known = course.get('prerequisite_descriptions', {})
+                for prereq in course.get('prerequisites', []):
+                    yield prereq, known.get(prereq)
+
+        def edges():
+            # Edge format: [prerequisite_course, dependent_course]
+            for course in courses_with_prereqs:
+                for prereq in course.get('prerequisites', []):
+                    yield prereq, course.get('course_title', 'Unknown')
+
+        graph = course_graph.build_graph(nodes(), edges())
+        if graph["cycles_broken"]:
+            logger.warning(f"Broke {graph['cycles_broken']} prerequisite cycle edge(s)")
+        logger.info(f"Created graph with {len(graph['nodes'])} vertices and {len(graph['edges'])} edges")
+        return graph
+
+
+def _recommender_with_client(client=None) -> CourseRecommendationSystem:
+    """Recommender bound to `client`, or built from the hardcoded key when client is None."""
+    # Use provided client or fallback to hardcoded API key
+    if client is not None:
+        # Create a temporary CourseRecommendationSystem with the provided client
+        recommender = CourseRecommendationSystem.__new__(CourseRecommendationSystem)
+        recommender.client = client
+        recommender.model = "claude-3-haiku-20240307"
+        recommender.available_departments = {
+            "Aeronautics_and_Astronautics": 92,
+            "Anthropology": 67,
+            "Architecture": 116,
+            "Athletics,_Physical_Education_and_Recreation": 10,
+            "Biological_Engineering": 41,
+            "Biology": 85,
+            "Brain_and_Cognitive_Sciences": 99,
+            "Chemical_Engineering": 57,
+            "Chemistry": 43,
+            "Civil_and_Environmental_Engineering": 105,
+            "Comparative_Media_Studies_Writing": 71,
+            "Concourse": 5,
+            "Earth,_Atmospheric,_and_Planetary_Sciences": 111,
+            "Economics": 85,
+            "Edgerton_Center": 28,
+            "Electrical_Engineering_and_Computer_Science": 298,
+            "Engineering_Systems_Division": 66,
+            "Experimental_Study_Group": 30,
+            "Global_Studies_and_Languages": 121,
+            "Health_Sciences_and_Technology": 72,
+            "History": 91,
+            "Institute_for_Data,_Systems,_and_Society": 20,
+            "Linguistics_and_Philosophy": 85,
+            "Literature": 128,
+            "Materials_Science_and_Engineering": 92,
+            "Mathematics": 213,
+            "Mechanical_Engineering": 162,
+            "Media_Arts_and_Sciences": 47,
+            "Music_and_Theater_Arts": 69,
+            "Nuclear_Science_and_Engineering": 53,
+            "Others": 67,
+            "Physics": 163,
+            "Political_Science": 71,
+            "Science,_Technology,_and_Society": 36,
+            "Sloan_School_of_Management": 123,
+            "Special_Programs": 26,
+            "Urban_Studies_and_Planning": 113,
+            "Women's_and_Gender_Studies": 21,
+        }
+    else:
+        # Fallback to original behavior
+        api_key = "sk-ant-REDACTED"
+        recommender = CourseRecommendationSystem(api_key)
 
-        # Create vertices (nodes) - each course is a vertex
-        vertices = []
-        course_names = set()
-
-        # Collect all course names first (including prerequisites)
-        all_course_names = set()
-        for course in courses_with_prereqs:
-            course_name = course.get('course_title', 'Unknown')
-            all_course_names.add(course_name)
-
-            # Add prerequisite names too
-            for prereq in course.get('prerequisites', []):
-                all_course_names.add(prereq)
-
-        # Create vertices list with original descriptions
-        for course in courses_with_prereqs:
-            course_name = course.get('course_title', 'Unknown')
-
-            # Try to get original description from the course data
-            # First try course_description, then short_description as fallback
-            # Try to get original description from the course data
-            original_desc = course.get('original_description', '')
-            if not original_desc:
-                original_desc = course.get('course_description', '')
-            if not original_desc or original_desc == 'No description':
-                original_desc = 'No description available'
-
-            vertices.append([course_name, original_desc])
-            course_names.add(course_name)
-
-        # Add vertices for prerequisites that aren't in main course list
-        for course in courses_with_prereqs:
-            for prereq in course.get('prerequisites', []):
-                if prereq not in course_names:
-                    vertices.append([prereq, "Prerequisite course - description not available"])
-                    course_names.add(prereq)
-
-        # Create edges - from prerequisite to dependent course
-        edges = []
-        for course in courses_with_prereqs:
-            course_name = course.get('course_title', 'Unknown')
-            prerequisites = course.get('prerequisites', [])
+    return recommender
 
-            for prereq in prerequisites:
-                # Edge format: [prerequisite_course, dependent_course]
-                edges.append([prereq, course_name])
 
-        logger.info(f"Created graph with {len(vertices)} vertices and {len(edges)} edges")
-        return [vertices, edges]
+def roadmap_engine() -> str:
+    """
+    ROADMAP_ENGINE: "llm" (default) or "local". local_roadmap builds the roadmap
+    from the catalog alone, with no API calls (previews, and a fallback when the
+    API is down).
+    """
+    return getenv("ROADMAP_ENGINE", "llm")
+
+
+def roadmap_graph_from_courses(courses_with_prereqs: List[Dict]) -> Dict:
+    """course_graph dict for courses already selected, e.g. the departments that finished before a deadline."""
+    graph = CourseRecommendationSystem.__new__(CourseRecommendationSystem).create_learning_graph(
+        courses_with_prereqs) if courses_with_prereqs else None
+    return graph or course_graph.empty_graph()
+
+
+def roadmap_from_courses(courses_with_prereqs: List[Dict]) -> tuple:
+    """(vertices, edges) for courses already selected."""
+    vertices, edges = course_graph.to_pairs(roadmap_graph_from_courses(courses_with_prereqs))
+    return (vertices, edges)
 
 
 def generate_course_roadmap(advisor_description: str, conversation_transcript: str,
-                            skill_levels: List[List[str]], client=None) -> tuple:
+                            skill_levels: List[List[str]], client=None, engine: Optional[str] = None) -> tuple:
     """
     Main function to generate course roadmap from student profile.
 
@@ -382,6 +737,7 @@ def generate_course_roadmap(advisor_description: str, conversation_transcript: s
         conversation_transcript: Q&A dialogue between advisor and student
         skill_levels: Array of [skill_name, skill_level] pairs
         client: Optional Anthropic client (if None, will use hardcoded API key)
+        engine: "llm" or "local" (defaults to roadmap_engine()); "local" skips the API
 
     Returns:
         tuple: (vertices, edges) where:
@@ -393,57 +749,11 @@ def generate_course_roadmap(advisor_description: str, conversation_transcript: s
         conversation_transcript = "Advisor: What interests you? Student: Neural networks and deep learning..."
         skill_levels = [["Mathematics", "Beginner"], ["Programming", "Intermediate"], ["Statistics", "Beginner"]]
     """
+    if (engine or roadmap_engine()) == "local":
+        from local_roadmap import generate_local_roadmap
+        return generate_local_roadmap(advisor_description, conversation_transcript, skill_levels)
     try:
-        # Use provided client or fallback to hardcoded API key
-        if client is not None:
-            # Create a temporary CourseRecommendationSystem with the provided client
-            recommender = CourseRecommendationSystem.__new__(CourseRecommendationSystem)
-            recommender.client = client
-            recommender.model = "claude-3-haiku-20240307"
-            recommender.available_departments = {
-                "Aeronautics_and_Astronautics": 92,
-                "Anthropology": 67,
-                "Architecture": 116,
-                "Athletics,_Physical_Education_and_Recreation": 10,
-                "Biological_Engineering": 41,
-                "Biology": 85,
-                "Brain_and_Cognitive_Sciences": 99,
-                "Chemical_Engineering": 57,
-                "Chemistry": 43,
-                "Civil_and_Environmental_Engineering": 105,
-                "Comparative_Media_Studies_Writing": 71,
-                "Concourse": 5,
-                "Earth,_Atmospheric,_and_Planetary_Sciences": 111,
-                "Economics": 85,
-                "Edgerton_Center": 28,
-                "Electrical_Engineering_and_Computer_Science": 298,
-                "Engineering_Systems_Division": 66,
-                "Experimental_Study_Group": 30,
-                "Global_Studies_and_Languages": 121,
-                "Health_Sciences_and_Technology": 72,
-                "History": 91,
-                "Institute_for_Data,_Systems,_and_Society": 20,
-                "Linguistics_and_Philosophy": 85,
-                "Literature": 128,
-                "Materials_Science_and_Engineering": 92,
-                "Mathematics": 213,
-                "Mechanical_Engineering": 162,
-                "Media_Arts_and_Sciences": 47,
-                "Music_and_Theater_Arts": 69,
-                "Nuclear_Science_and_Engineering": 53,
-                "Others": 67,
-                "Physics": 163,
-                "Political_Science": 71,
-                "Science,_Technology,_and_Society": 36,
-                "Sloan_School_of_Management": 123,
-                "Special_Programs": 26,
-                "Urban_Studies_and_Planning": 113,
-                "Women's_and_Gender_Studies": 21,
-            }
-        else:
-            # Fallback to original behavior
-            api_key = "sk-ant-REDACTED"
-            recommender = CourseRecommendationSystem(api_key)
+        recommender = _recommender_with_client(client)
 
         # Step 1: Select departments
         departments = recommender.select_departments(advisor_description, conversation_transcript, skill_levels)
@@ -488,6 +798,83 @@ def generate_course_roadmap(advisor_description: str, conversation_transcript: s
 
 
 
+def roadmap_stage_deadlines() -> Dict[str, float]:
+    """Per-stage budgets (seconds) for agenerate_course_roadmap, read from the .env at call time."""
+    return {
+        "departments": float(getenv("ROADMAP_DEADLINE_DEPARTMENTS", "20")),
+        "courses": float(getenv("ROADMAP_DEADLINE_COURSES", "45")),
+    }
+
+
+async def agenerate_course_roadmap(advisor_description: str, conversation_transcript: str,
+                                   skill_levels: List[List[str]], async_client,
+                                   deadlines: Optional[Dict[str, float]] = None,
+                                   emit: Optional[Callable[[Dict], None]] = None, as_graph: bool = False):
+    """
+    Async version of generate_course_roadmap on a shared AsyncAnthropic client.
+
+    Args:
+        async_client: AsyncAnthropic instance (reused across requests for keep-alive)
+        deadlines: Optional overrides for roadmap_stage_deadlines(). If department
+                   selection runs out of time the roadmap is empty; per-department
+                   course selection drops only the departments that are late.
+        emit: Optional callback receiving progress events as they happen:
+              {"event": "departments", "departments": [...]} and one
+              {"event": "department_courses", "department": ..., "courses": [...]}
+              per department.
+        as_graph: Return the course_graph dict (integer ids, order, depth)
+                  the roadmap is built as, instead of converting it to pairs.
+
+    Returns:
+        tuple: (vertices, edges), same shape as generate_course_roadmap,
+        or the course_graph dict with as_graph
+    """
+    limits = {**roadmap_stage_deadlines(), **(deadlines or {})}
+    empty = course_graph.empty_graph() if as_graph else ([], [])
+    try:
+        recommender = _recommender_with_client(async_client)
+        recommender.async_client = async_client
+
+        # Step 1: Select departments
+        departments = await asyncio.wait_for(
+            recommender.aselect_departments(advisor_description, conversation_transcript, skill_levels),
+            limits["departments"]
+        )
+        if emit:
+            emit({"event": "departments", "departments": departments or []})
+        if not departments:
+            logger.warning("No departments selected, returning empty graph")
+            return empty
+
+        # Step 2: Select courses with prerequisites (departments fan out concurrently)
+        on_department = None
+        if emit:
+            def on_department(department, department_courses):
+                emit({"event": "department_courses", "department": department, "courses": department_courses})
+        courses = await recommender.aselect_courses_with_prerequisites(
+            departments, advisor_description, conversation_transcript, skill_levels,
+            timeout=limits["courses"], on_department=on_department
+        )
+        if not courses:
+            logger.warning("No courses selected, returning empty graph")
+            return empty
+
+        # Step 3: Create course graph
+        graph = recommender.create_learning_graph(courses)
+        logger.info(f"Successfully generated roadmap with {len(graph['nodes'])} courses and {len(graph['edges'])} dependencies")
+        if as_graph:
+            return graph
+        vertices, edges = course_graph.to_pairs(graph)
+        return (vertices, edges)
+
+    except asyncio.TimeoutError:
+        logger.warning("Department selection exceeded its deadline, returning empty graph")
+        return empty
+    except Exception as e:
+        logger.error(f"Error generating course roadmap: {str(e)}")
+        return empty
+
+
 def main():
     """Example usage of the Course Recommendation System."""
     # Initialize system with your API key
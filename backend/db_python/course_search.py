@@ -0,0 +1,102 @@
+# course_search.py — local BM25 ranking of a department's courses against a student profile
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Generic English plus words that appear in nearly every OCW blurb
+STOPWORDS = frozenset("""
+a an and are as at be been but by can course courses do does for from has have how i in include
+includes including into introduction is it its me my of on or our so student students such that
+the their them there these they this to topic topics us use used using was we were what when
+which while who will with would you your also about after all any both each how more most other
+over some than then through under up very want like just really know think get
+""".split())
+
+TITLE_WEIGHT = 2  # title tokens count twice: titles are short and specific
+K1 = 1.5
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        if len(tok) < 2 or tok in STOPWORDS:
+            continue
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]  # cheap plural folding: "networks" ~ "network"
+        tokens.append(tok)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over title (weighted) + description of each course."""
+
+    def __init__(self, courses: List[Dict]):
+        self.courses = courses
+        self.postings: Dict[str, List] = {}  # term -> [(doc, tf)]
+        lengths = []
+        for doc, course in enumerate(courses):
+            tf = Counter(tokenize(course.get("short_description", "")))
+            for tok in tokenize(course.get("title", "")):
+                tf[tok] += TITLE_WEIGHT
+            lengths.append(sum(tf.values()))
+            for term, n in tf.items():
+                self.postings.setdefault(term, []).append((doc, n))
+        self.lengths = lengths
+        self.avg_len = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    def scores(self, query: str) -> List[float]:
+        n_docs = len(self.courses)
+        out = [0.0] * n_docs
+        if not n_docs or not self.avg_len:
+            return out
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc, tf in posting:
+                norm = K1 * (1 - B + B * self.lengths[doc] / self.avg_len)
+                out[doc] += idf * tf * (K1 + 1) / (tf + norm)
+        return out
+
+    def top_positions(self, query: str, n: int) -> List[int]:
+        """Positions in `courses` of the n best courses, best first; ties (including no match at all) keep catalog order."""
+        scores = self.scores(query)
+        return sorted(range(len(self.courses)), key=lambda i: -scores[i])[:n]
+
+    def top(self, query: str, n: int) -> List[Dict]:
+        """The n best courses, best first."""
+        return [self.courses[i] for i in self.top_positions(query, n)]
+
+
+# Department lists come from DEPARTMENT_CACHE, which hands back the same list
+# object while the JSON is unchanged, so an index is reused for as long as
+# its list is.
+_indexes: Dict[str, BM25Index] = {}
+_lock = threading.Lock()
+
+
+def department_index(department: str, courses: List[Dict]) -> BM25Index:
+    with _lock:
+        index = _indexes.get(department)
+        if index is not None and index.courses is courses:
+            return index
+    index = BM25Index(courses)
+    with _lock:
+        _indexes[department] = index
+    return index
+
+
+def top_courses(department: str, courses: List[Dict], query: str, n: int) -> List[Dict]:
+    """The n courses of `department` most relevant to `query` (all of them, ranked, if there are fewer)."""
+    return department_index(department, courses).top(query, n)
+
+
+def top_positions(department: str, courses: List[Dict], query: str, n: int) -> List[int]:
+    """top_courses as positions in `courses`."""
+    return department_index(department, courses).top_positions(query, n)
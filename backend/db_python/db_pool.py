@@ -0,0 +1,66 @@
+# db_pool.py — one lazily created Postgres connection pool per worker process
+# pip install "psycopg[binary,pool]"
+import atexit
+import os
+import threading
+from typing import Dict
+
+from env_loader import load_env
+
+_pool = None
+_pid = None  # process that opened _pool; a forked child must not reuse its sockets
+_lock = threading.Lock()
+
+
+def config() -> Dict[str, str]:
+    """Connection settings from the environment (same variables as the Node backend)."""
+    load_env()
+    return dict(
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        dbname=os.getenv("DB_NAME"),
+        sslmode=os.getenv("DB_SSLMODE", "require"),
+    )
+
+
+def pool():
+    """
+    The worker's psycopg_pool.ConnectionPool, opened on first use. Connections
+    are kept between requests (at most DB_POOL_MAX, idle ones closed after
+    DB_POOL_MAX_IDLE seconds), so a request pays for the TLS handshake and
+    authentication only when the pool has to grow.
+    """
+    global _pool, _pid
+    with _lock:
+        if _pool is None or _pid != os.getpid():
+            from psycopg_pool import ConnectionPool
+            cfg = config()
+            missing = [k for k, v in cfg.items() if not v and k != "sslmode"]
+            if missing:
+                raise ValueError(f"Missing database environment variables: {missing}")
+            _pool = ConnectionPool(
+                kwargs=cfg,
+                min_size=int(os.getenv("DB_POOL_MIN", "1")),
+                max_size=int(os.getenv("DB_POOL_MAX", "4")),
+                max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+                name="db_python",
+                open=True,
+            )
+            _pid = os.getpid()
+        return _pool
+
+
+def connection():
+    """`with connection() as conn:` borrows a pooled connection; commits on success, rolls back on error."""
+    return pool().connection()
+
+
+@atexit.register
+def close():
+    global _pool
+    with _lock:
+        if _pool is not None and _pid == os.getpid():
+            _pool.close()
+        _pool = None
@@ -0,0 +1,44 @@
+# env_loader.py — resolve the .env file once per process
+import os
+
+# Same search order the scripts always used (relative to the db_python cwd)
+ENV_PATHS = [
+    '../../frontend/.env',
+    '../.env',
+    '.env'
+]
+ENV_ENCODINGS = ['utf-16', 'utf-8', 'latin-1']
+
+_resolved = None  # None = not loaded yet; "" = loaded, nothing found
+
+
+def load_env():
+    """
+    Load the first existing .env (trying each encoding) exactly once.
+    Later calls are free. Returns the path that was loaded, or None.
+    """
+    global _resolved
+    if _resolved is not None:
+        return _resolved or None
+
+    _resolved = ""
+    candidates = [p for p in ENV_PATHS if os.path.exists(p)]
+    if not candidates:
+        return None
+
+    from dotenv import load_dotenv
+    for env_path in candidates:
+        for encoding in ENV_ENCODINGS:
+            try:
+                load_dotenv(dotenv_path=env_path, encoding=encoding)
+                _resolved = env_path
+                return _resolved
+            except UnicodeDecodeError:
+                continue
+    return None
+
+
+def getenv(name, default=None):
+    """os.getenv after making sure the .env file has been loaded."""
+    load_env()
+    return os.getenv(name, default)
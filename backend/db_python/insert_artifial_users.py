@@ -1,18 +1,7 @@
-import os, random, itertools
+import random, itertools
 from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional
-from dotenv import load_dotenv
-import psycopg
-
-load_dotenv("../../frontend/.env")
-CFG = dict(
-    host=os.getenv("DB_HOST"),
-    port=os.getenv("DB_PORT"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    dbname=os.getenv("DB_NAME"),
-    sslmode=os.getenv("DB_SSLMODE", "require"),
-)
+import db_pool
 
 FIRST_NAMES = ["Noah","Emilia","Samir","Lena","Matthew","Amira","Diego","Yuko","Sofia","Marco",
                "Fatima","Li","Daniel","Nina","Peter","Amélie","Lucas","Hana","Chidi","Aisha",
@@ -81,7 +70,7 @@ def random_persona(existing_emails: set) -> Persona:
 
 def insert_personas(personas: List[Persona]):
     if not personas: return
-    with psycopg.connect(**CFG) as conn:
+    with db_pool.connection() as conn:
         with conn.cursor() as cur:
             for p in personas:
                 cur.execute("""
@@ -104,7 +93,7 @@ def insert_personas(personas: List[Persona]):
 
 def seed_random_users(count: int = 25):
     existing = set()
-    with psycopg.connect(**CFG) as conn, conn.cursor() as cur:
+    with db_pool.connection() as conn, conn.cursor() as cur:
         cur.execute("SELECT email FROM users;")
         for (e,) in cur.fetchall(): existing.add(e)
     personas = [random_persona(existing) for _ in range(count)]
@@ -0,0 +1,143 @@
+# llm_cache.py — content-addressed on-disk cache of LLM response text
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from typing import Dict, Optional
+from env_loader import getenv
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class LLMCache:
+    """
+    Response text keyed by sha256 of the request (model, system, prompt,
+    max_tokens, ...). One small JSON file per entry under `root`, sharded by
+    the first two hex digits. Entries older than `ttl` seconds are ignored and
+    removed; once the directory grows past `max_bytes`, the oldest entries are
+    evicted first. Safe to share between threads and between worker processes
+    (writes go through a temp file + rename).
+    """
+
+    def __init__(self, root: str, ttl: float, max_bytes: int, enabled: bool = True):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._bytes = None  # computed on first write
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(**parts) -> str:
+        material = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        if time.time() - entry.get("created", 0) > self.ttl:
+            self._remove(path)
+            with self._lock:
+                self.expired += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry.get("text")
+
+    def put(self, key: str, text: str):
+        if not self.enabled or text is None:
+            return
+        path = self._path(key)
+        data = json.dumps({"created": time.time(), "text": text}, ensure_ascii=False).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"LLM cache write failed: {e}")
+            return
+        with self._lock:
+            self.writes += 1
+            if self._bytes is None:
+                self._bytes = self._scan_bytes()
+            else:
+                self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: str) -> int:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    def _entries(self):
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield st.st_mtime, st.st_size, path
+
+    def _scan_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Oldest first until we are back under 90% of the cap
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(self._entries()):
+            if self._bytes <= target:
+                break
+            self._bytes -= self._remove(path)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+LLM_CACHE = LLMCache(
+    root=getenv("LLM_CACHE_DIR", os.path.join(HERE, ".llm_cache")),
+    ttl=float(getenv("LLM_CACHE_TTL", 7 * 24 * 3600)),
+    max_bytes=int(getenv("LLM_CACHE_MAX_BYTES", 100 * 1024 * 1024)),
+    enabled=getenv("LLM_CACHE", "1") != "0",
+)
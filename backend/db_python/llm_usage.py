@@ -0,0 +1,43 @@
+# llm_usage.py — per-call token usage and prompt-cache counters for Anthropic requests
+import threading
+from collections import deque
+from typing import Any, Dict
+
+# Fields of the API's `usage` object; the cache ones are 0 (or absent) when
+# the request had no cache_control breakpoint
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+
+class UsageStats:
+    """
+    Totals per label (e.g. "departments", "courses:Mathematics") plus the last
+    `recent` calls, so cache writes on a department's first request and reads
+    on the following ones can be checked from a live worker.
+    """
+
+    def __init__(self, recent: int = 50):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._recent = deque(maxlen=recent)
+
+    def record(self, label: str, usage: Any, seconds: float) -> Dict:
+        """Add one response's usage (None-safe) and its latency; returns the per-call entry."""
+        call = {f: int(getattr(usage, f, 0) or 0) for f in USAGE_FIELDS}
+        call["seconds"] = round(seconds, 3)
+        with self._lock:
+            totals = self._totals.setdefault(label, dict.fromkeys(("calls", "seconds") + USAGE_FIELDS, 0))
+            totals["calls"] += 1
+            for f in USAGE_FIELDS + ("seconds",):
+                totals[f] += call[f]
+            self._recent.append({"label": label, **call})
+        return call
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "totals": {label: {**t, "seconds": round(t["seconds"], 3)} for label, t in self._totals.items()},
+                "recent": list(self._recent),
+            }
+
+
+LLM_USAGE = UsageStats()
@@ -0,0 +1,188 @@
+# local_roadmap.py — course roadmap straight from the catalog, no LLM calls
+import threading
+import time
+import logging
+from typing import Dict, List, Optional
+
+import catalog_index
+import course_graph
+import prereq_graph
+from course_search import BM25Index
+from prereq_graph import CITE_RE, level_rank, number_key
+
+logger = logging.getLogger(__name__)
+
+MAX_DEPARTMENTS = 3
+COURSES_PER_DEPARTMENT = 4
+DEPARTMENT_MIN_SHARE = 0.35  # a department needs this share of the best department's score
+DEPARTMENT_TOP_COURSES = 5   # department score = sum of its best few course scores
+FOUNDATION_MIN_SHARE = 0.5   # an unpicked prerequisite needs this share of its dependent's score
+
+SKILL_RANK = {"beginner": 0, "intermediate": 1, "advanced": 2}
+
+class LocalCatalog:
+    """Every department's courses in one BM25 index, with course-number lookups."""
+
+    def __init__(self, lists: Dict[str, List[Dict]]):
+        self.lists = lists
+        self.courses: List[Dict] = [c for courses in lists.values() for c in courses]
+        self.index = BM25Index(self.courses)
+        self.rank = [level_rank(c.get("level")) for c in self.courses]
+        self.keys = [number_key(c.get("coursenum")) for c in self.courses]
+        self.by_num: Dict[str, int] = {}
+        self.by_subject: Dict[str, List[int]] = {}
+        for i, c in enumerate(self.courses):
+            num = (c.get("coursenum") or "").strip().upper()
+            if num:
+                self.by_num.setdefault(num, i)
+            if self.keys[i]:
+                self.by_subject.setdefault(self.keys[i][0], []).append(i)
+
+    def before(self, a: int, b: int) -> bool:
+        """Whether course a sits below course b: lower level, or same level and lower number in the same subject."""
+        return prereq_graph.below((self.rank[a], self.keys[a]), (self.rank[b], self.keys[b]))
+
+    def cited(self, i: int) -> List[int]:
+        """Catalog courses whose numbers appear in course i's description and sit below it."""
+        text = self.courses[i].get("short_description") or ""
+        found = []
+        for num in CITE_RE.findall(text.upper()):
+            j = self.by_num.get(num)
+            if j is not None and j != i and j not in found and self.before(j, i):
+                found.append(j)
+        return found
+
+    def verified(self, graph: prereq_graph.PrereqGraph, i: int) -> List[int]:
+        """Course i's prerequisites from the offline graph, as catalog positions."""
+        found = []
+        for p in graph.prerequisites(self.courses[i].get("coursenum")):
+            j = self.by_num.get(p["coursenum"])
+            if j is not None and j != i and j not in found:
+                found.append(j)
+        return found
+
+
+# Rebuilt whenever DEPARTMENT_CACHE hands back a different list for some department
+_catalog: Optional[LocalCatalog] = None
+_lock = threading.Lock()
+
+
+def local_catalog() -> LocalCatalog:
+    global _catalog
+    lists = {}
+    for department in catalog_index.departments():
+        courses = catalog_index.DEPARTMENT_CACHE.get(department, catalog_index.read_department)
+        if courses:
+            lists[department] = courses
+    with _lock:
+        current = _catalog
+    if current is not None and current.lists.keys() == lists.keys() and \
+            all(current.lists[d] is lists[d] for d in lists):
+        return current
+    built = LocalCatalog(lists)
+    with _lock:
+        _catalog = built
+    return built
+
+
+def _short(text: str, limit: int = 100) -> str:
+    text = (text or "").strip()
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + "..."
+
+
+def select_courses(advisor_description: str, conversation_transcript: str,
+                   skill_levels: List[List[str]]) -> List[Dict]:
+    """
+    Courses with prerequisites in the shape CourseRecommendationSystem's
+    select_courses_with_prerequisites returns, chosen without an LLM:
+
+    1. BM25 over the whole catalog against the profile text; each department
+       scores the sum of its best few courses and the top ones (at most
+       MAX_DEPARTMENTS, each within DEPARTMENT_MIN_SHARE of the best) are kept.
+    2. The best COURSES_PER_DEPARTMENT courses of each, with courses more than
+       one level above the student's skills ranked down.
+    3. Prerequisites: the course's edges in the offline prerequisite graph
+       (prereq_graph; without it, catalog courses cited by number in its
+       description that sit below it), plus the closest lower course of the
+       same subject among the picks (or, failing that, the most relevant
+       lower course of the subject in the catalog, if it is nearly as
+       relevant).
+    """
+    cat = local_catalog()
+    if not cat.courses:
+        return []
+    # skill names only: "Advanced" / "Beginner" would match course titles
+    skills_text = " ".join(s[0] for s in skill_levels if s)
+    scores = cat.index.scores("\n".join([advisor_description, conversation_transcript, skills_text]))
+
+    ranks = [SKILL_RANK[s[1].strip().lower()] for s in skill_levels
+             if len(s) >= 2 and s[1].strip().lower() in SKILL_RANK]
+    reach = (max(ranks) if ranks else 1) + 1
+    for i, score in enumerate(scores):
+        if score and cat.rank[i] > reach:
+            scores[i] = score * 0.5
+
+    by_department: Dict[str, List[int]] = {}
+    for i, c in enumerate(cat.courses):
+        if scores[i] > 0:
+            by_department.setdefault(c["department"], []).append(i)
+    if not by_department:
+        return []
+    for picks in by_department.values():
+        picks.sort(key=lambda i: -scores[i])
+    department_score = {d: sum(scores[i] for i in picks[:DEPARTMENT_TOP_COURSES])
+                        for d, picks in by_department.items()}
+    ranked = sorted(department_score, key=lambda d: -department_score[d])
+    best = department_score[ranked[0]]
+    chosen = [d for d in ranked[:MAX_DEPARTMENTS] if department_score[d] >= DEPARTMENT_MIN_SHARE * best]
+
+    selected = [i for d in chosen for i in by_department[d][:COURSES_PER_DEPARTMENT]]
+    graph = prereq_graph.load_graph()
+    out = []
+    for i in selected:
+        prereqs = cat.verified(graph, i) if graph else cat.cited(i)
+        subject = cat.keys[i][0] if cat.keys[i] else None
+        if subject:
+            lower = [j for j in selected if j != i and cat.keys[j] and cat.keys[j][0] == subject and cat.before(j, i)]
+            if lower:
+                # closest one below: the others chain through it
+                prereqs.append(max(lower, key=lambda j: (cat.rank[j], cat.keys[j][1])))
+            elif not prereqs:
+                floor = FOUNDATION_MIN_SHARE * scores[i]
+                lower = [j for j in cat.by_subject.get(subject, ()) if scores[j] >= floor and cat.before(j, i)]
+                if lower:
+                    prereqs.append(max(lower, key=lambda j: scores[j]))
+        course = cat.courses[i]
+        prereq_titles = list(dict.fromkeys(cat.courses[j]["title"] for j in prereqs))
+        out.append({
+            "course_title": course["title"],
+            "course_description": _short(course.get("short_description")),
+            "department": course["department"],
+            "prerequisites": prereq_titles,
+            "original_description": course.get("short_description") or "No description available",
+            "prerequisite_descriptions": {cat.courses[j]["title"]: cat.courses[j]["short_description"]
+                                          for j in prereqs if cat.courses[j].get("short_description")},
+        })
+    return out
+
+
+def generate_local_roadmap(advisor_description: str, conversation_transcript: str,
+                           skill_levels: List[List[str]], as_graph: bool = False):
+    """
+    generate_course_roadmap without the LLM: (vertices, edges) from
+    select_courses, or the course_graph dict with as_graph.
+    """
+    from course_recommender import roadmap_graph_from_courses
+    started = time.perf_counter()
+    try:
+        courses = select_courses(advisor_description, conversation_transcript, skill_levels)
+    except Exception as e:
+        logger.error(f"Error building local roadmap: {e}")
+        courses = []
+    graph = roadmap_graph_from_courses(courses)
+    logger.info(f"Local roadmap: {len(graph['nodes'])} courses, {len(graph['edges'])} edges "
+                f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+    if as_graph:
+        return graph
+    vertices, edges = course_graph.to_pairs(graph)
+    return (vertices, edges)
@@ -0,0 +1,96 @@
+# phrase_matcher.py — find every vocabulary phrase in a text (C substring search, or Aho-Corasick for large vocabularies)
+from bisect import bisect_right
+from collections import deque
+from typing import Iterable, List, Set
+
+# Below this many phrases, CPython's C substring search (one `in` per phrase)
+# beats the pure-Python automaton, which costs ~85 ns per character against
+# ~0.7 ns per character per phrase. On 36 KB of course text: 35 phrases 0.9 ms
+# vs 3.1 ms, 93 phrases 2.4 vs 3.4, 150 phrases 3.9 vs 3.0, 300 phrases 7.3 vs
+# 3.2. Both scale with the text, so the crossover (~120) does not depend on it.
+# A compiled re per phrase was slower than `in` (2.2 ms for the 35 terms).
+AUTOMATON_MIN_PHRASES = 128
+
+
+class PhraseMatcher:
+    """
+    Compiled once over a fixed phrase list (already lower-cased).
+
+    phrases_in(text)     -> phrases occurring anywhere in text (substring
+                            semantics, overlaps included): one C substring
+                            search per phrase, or for vocabularies of
+                            `automaton_min_phrases` or more an Aho-Corasick
+                            automaton, one step per character whatever the
+                            size of the vocabulary.
+    phrases_containing(s)-> phrases that contain s; one str.find sweep over
+                            the joined vocabulary instead of a loop in Python.
+    """
+
+    def __init__(self, phrases: Iterable[str], automaton_min_phrases: int = AUTOMATON_MIN_PHRASES):
+        self.phrases: List[str] = list(dict.fromkeys(p for p in phrases if p))
+        self._delta = None
+        if len(self.phrases) >= automaton_min_phrases:
+            self._build_automaton()
+
+        # joined vocabulary for reverse (term-inside-phrase) lookups
+        self._joined = "\0".join(self.phrases)
+        self._starts = []
+        pos = 0
+        for phrase in self.phrases:
+            self._starts.append(pos)
+            pos += len(phrase) + 1
+
+    def _build_automaton(self):
+        # trie
+        goto = [{}]
+        out: List[List[int]] = [[]]
+        for idx, phrase in enumerate(self.phrases):
+            state = 0
+            for ch in phrase:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(idx)
+
+        # failure links breadth first, folded into a full transition table
+        # (delta) so the scan never walks failure chains
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            d = dict(delta[fail[state]])
+            d.update(goto[state])
+            delta[state] = d
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+                queue.append(nxt)
+        self._delta, self._out = delta, out
+
+    def phrases_in(self, text: str) -> Set[str]:
+        if self._delta is None:
+            return {p for p in self.phrases if p in text}
+        delta, out = self._delta, self._out
+        found = set()
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return {self.phrases[i] for i in found}
+
+    def phrases_containing(self, text: str) -> Set[str]:
+        if not text or "\0" in text:
+            return set()
+        found = set()
+        pos = self._joined.find(text)
+        while pos != -1:
+            found.add(self.phrases[bisect_right(self._starts, pos) - 1])
+            pos = self._joined.find(text, pos + 1)
+        return found
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Catalog-wide prerequisite graph extracted from the OCW metadata.
+
+`build_graph_file` reads every departments/*.json once and derives edges
+(prerequisite -> dependent) from three sources:
+  * stated  — a course number cited in a description right after a cue such
+              as "prerequisite" or "assumes" ("Prerequisites: 18.01 and 8.01");
+  * ordered — any other cited course number that sits below the citing
+              course (lower level, or the same level and a lower number in
+              the same subject), so "see also 18.100" never points downwards;
+  * sequence — numbered parts of one series ("Calculus 1A" -> "1B" -> "1C",
+              "Astrophysics I" -> "II").
+Cross-listed numbers (department_course_numbers, "J" suffixes) resolve to
+one node per course, and any edge that would close a cycle is dropped. The
+result is stored as a compact adjacency file (CSR: offsets + prerequisite
+ids per course) next to departments/.
+
+Build (re-run after refreshing departments/):
+    python prereq_graph.py build
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import catalog_index
+import course_graph
+from env_loader import getenv
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+VERSION = 1
+
+
+def default_graph_path() -> str:
+    """PREREQ_GRAPH_PATH, read on use: the .env is loaded lazily, after import."""
+    return getenv("PREREQ_GRAPH_PATH", os.path.join(HERE, "prereq_graph.json"))
+
+
+def freshness_check_seconds() -> float:
+    """PREREQ_GRAPH_CHECK_SECONDS: load_graph stats the graph file and every departments/*.json at most this often."""
+    return float(getenv("PREREQ_GRAPH_CHECK_SECONDS", "30"))
+
+
+# Run "level" labels -> rank; a course takes its lowest label
+LEVEL_RANK = {
+    "High School": 0, "Introductory": 0, "Non-Credit": 0,
+    "Undergraduate": 1, "Intermediate": 1,
+    "Graduate": 2, "Advanced": 2,
+}
+
+# "18.06", "6.006", "21H.181", "STS.025J"; special subjects ("18.S096") have no position
+_NUM_RE = re.compile(r"^(\d{1,2}[A-Z]?|[A-Z]{2,4})\.(\d{2,4})[A-Z]?$")
+CITE_RE = re.compile(r"\b((?:\d{1,2}[A-Z]?|[A-Z]{2,4})\.(?:\d{2,4}|S\d{2,3})[A-Z]?)\b")
+_CUE_RE = re.compile(r"prereq|prerequisite|require|assume|background in|familiarity with|"
+                     r"after taking|completed|preparation", re.I)
+CUE_WINDOW = 120  # characters before a citation searched for a cue
+_PART_RE = re.compile(r"^(.+?)[\s,]+(?:part\s+)?([IVX]+|\d{1,2}[A-Z]?)$", re.I)
+_ROMAN = {"I": 1, "II": 2, "III": 3, "IV": 4, "V": 5, "VI": 6, "VII": 7, "VIII": 8, "IX": 9, "X": 10}
+
+
+def level_rank(level: str) -> int:
+    ranks = [LEVEL_RANK[l.strip()] for l in (level or "").split(",") if l.strip() in LEVEL_RANK]
+    return min(ranks) if ranks else 1
+
+
+def normalize_num(num: str) -> str:
+    return (num or "").strip().upper()
+
+
+def number_key(coursenum: str) -> Optional[Tuple[str, float]]:
+    """
+    (subject, position) for an MIT course number, or None for special
+    subjects and non-MIT numbers. Position reads the digits as a decimal
+    fraction, which matches MIT numbering tiers: 18.01 < 18.06 < 18.100 <
+    18.700, 6.006 < 6.046.
+    """
+    m = _NUM_RE.match(normalize_num(coursenum))
+    if not m:
+        return None
+    return m.group(1), float("0." + m.group(2))
+
+
+def below(a: Tuple[int, Optional[Tuple[str, float]]], b: Tuple[int, Optional[Tuple[str, float]]]) -> bool:
+    """Whether (level rank, number key) a sits below b: lower level, or same level and lower number in one subject."""
+    if a[0] != b[0]:
+        return a[0] < b[0]
+    ka, kb = a[1], b[1]
+    return bool(ka and kb and ka[0] == kb[0] and ka[1] < kb[1])
+
+
+def _series(title: str) -> Optional[Tuple[str, Tuple]]:
+    """("calculus", (1, "A")) for "Calculus 1A: Differentiation"; None when the title has no part number."""
+    m = _PART_RE.match((title or "").split(":")[0].strip())
+    if not m:
+        return None
+    part = m.group(2).upper()
+    if part in _ROMAN:
+        order = (_ROMAN[part], "")
+    elif part[0].isdigit():
+        digits = part.rstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+        order = (int(digits), part[len(digits):])
+    else:
+        return None
+    return m.group(1).strip().lower(), order
+
+
+def _texts(course: Dict) -> str:
+    parts = [course.get("short_description"), course.get("full_description")]
+    for run in course.get("runs") or []:
+        parts.append(run.get("short_description"))
+        parts.append(run.get("full_description"))
+    return " ".join(catalog_index._clean(p) for p in parts if p)
+
+
+def _sources(departments_dir: str) -> Dict[str, List[int]]:
+    out = {}
+    for fname in sorted(os.listdir(departments_dir)):
+        if fname.endswith(".json"):
+            st = os.stat(os.path.join(departments_dir, fname))
+            out[fname[:-len(".json")]] = [st.st_mtime_ns, st.st_size]
+    return out
+
+
+def extract(departments_dir: str = None) -> Dict:
+    """The graph as a dict (see build_graph_file) without writing it."""
+    departments_dir = departments_dir or catalog_index.DEPARTMENTS_DIR
+    courses: List[List] = []         # [coursenum, department, title]
+    order: List[Tuple] = []          # (level rank, number key) per course
+    texts: List[List[str]] = []
+    ids: Dict[str, int] = {}         # primary number -> id
+    cross: List[Tuple[str, int]] = []
+
+    sources = _sources(departments_dir)
+    for department in sources:
+        with open(os.path.join(departments_dir, department + ".json"), "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        for course in raw:
+            num = normalize_num(course.get("coursenum"))
+            if not num:
+                continue
+            i = ids.get(num)
+            if i is None:  # the same course may appear in several department files
+                i = ids[num] = len(courses)
+                courses.append([num, department, course.get("title") or "No Title"])
+                order.append((level_rank(catalog_index.course_level(course)), number_key(num)))
+                texts.append([])
+            texts[i].append(_texts(course))
+            for listing in course.get("department_course_numbers") or []:
+                cross.append((normalize_num(listing.get("coursenum")), i))
+
+    # Cross-listed numbers resolve to their course; a primary number always wins
+    aliases: Dict[str, int] = {}
+    for num, i in cross:
+        if num and num not in ids:
+            aliases.setdefault(num, i)
+
+    def resolve(num: str) -> Optional[int]:
+        for n in (num, num[:-1] if num.endswith("J") else num + "J"):
+            i = ids.get(n)
+            if i is None:
+                i = aliases.get(n)
+            if i is not None:
+                return i
+        return None
+
+    edges: Dict[Tuple[int, int], str] = {}
+    for b, parts in enumerate(texts):
+        text = " ".join(parts)
+        upper = text.upper()
+        for m in CITE_RE.finditer(upper):
+            a = resolve(m.group(1))
+            if a is None or a == b or (a, b) in edges:
+                continue
+            stated = _CUE_RE.search(text, max(0, m.start() - CUE_WINDOW), m.start()) is not None
+            if stated and not below(order[b], order[a]):
+                edges[(a, b)] = "stated"
+            elif below(order[a], order[b]):
+                edges[(a, b)] = "ordered"
+
+    series: Dict[Tuple[str, str], List[Tuple[Tuple, int]]] = {}
+    for i, (num, _, title) in enumerate(courses):
+        s = _series(title)
+        if s:
+            subject = order[i][1][0] if order[i][1] else ""
+            series.setdefault((subject, s[0]), []).append((s[1], i))
+    for parts in series.values():
+        parts.sort()
+        for (pa, a), (pb, b) in zip(parts, parts[1:]):
+            if pa != pb and not below(order[b], order[a]):
+                edges.setdefault((a, b), "sequence")
+
+    # One pass of course_graph drops edges that would close a cycle
+    graph = course_graph.build_graph(((c[0], None) for c in courses),
+                                     ((courses[a][0], courses[b][0]) for a, b in edges))
+    prereqs: List[List[int]] = [[] for _ in courses]
+    for a, b in graph["edges"]:
+        prereqs[b].append(a)
+    offsets, flat = [0], []
+    for p in prereqs:
+        flat.extend(sorted(p))
+        offsets.append(len(flat))
+
+    kept = {(a, b) for a, b in graph["edges"]}
+    kinds: Dict[str, int] = {}
+    for edge, kind in edges.items():
+        if edge in kept:
+            kinds[kind] = kinds.get(kind, 0) + 1
+    return {
+        "version": VERSION,
+        "sources": sources,
+        "courses": courses,
+        "aliases": aliases,
+        "offsets": offsets,
+        "prereqs": flat,
+        "stats": {"courses": len(courses), "edges": len(flat), "cycles_broken": graph["cycles_broken"], **kinds},
+    }
+
+
+def build_graph_file(departments_dir: str = None, graph_path: str = None) -> Dict:
+    """Extract the graph and write it to graph_path (atomically). Returns its stats."""
+    graph_path = graph_path or default_graph_path()
+    data = extract(departments_dir)
+    tmp_path = graph_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, graph_path)
+    with _lock:
+        _state.clear()
+    return data["stats"]
+
+
+# ---------- query side ----------
+class PrereqGraph:
+    """Read-only view over a loaded graph file."""
+
+    def __init__(self, data: Dict):
+        self.courses = data["courses"]
+        self.offsets = data["offsets"]
+        self.prereqs = data["prereqs"]
+        self.ids = {c[0]: i for i, c in enumerate(self.courses)}
+        self.aliases = data.get("aliases", {})
+
+    def find(self, coursenum: str) -> Optional[int]:
+        num = normalize_num(coursenum)
+        i = self.ids.get(num)
+        return i if i is not None else self.aliases.get(num)
+
+    def prerequisites(self, coursenum: str) -> List[Dict]:
+        """Direct prerequisites of a course as {"coursenum", "department", "title"} dicts."""
+        i = self.find(coursenum)
+        if i is None:
+            return []
+        return [dict(zip(("coursenum", "department", "title"), self.courses[j]))
+                for j in self.prereqs[self.offsets[i]:self.offsets[i + 1]]]
+
+
+_state: Dict = {}
+_lock = threading.Lock()
+
+
+def load_graph() -> Optional[PrereqGraph]:
+    """
+    The graph file, loaded once per file version, or None when it is missing,
+    unreadable or older than departments/ (run `python prereq_graph.py build`).
+    The file checks are repeated at most every freshness_check_seconds(), so
+    calling this per request costs a dict lookup.
+    """
+    now = time.monotonic()
+    with _lock:
+        if "checked_at" in _state and now - _state["checked_at"] < _state["check_seconds"]:
+            return _state["result"]
+    path = default_graph_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    with _lock:
+        if mtime is not None and _state.get("mtime") != mtime:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                graph = PrereqGraph(data) if data.get("version") == VERSION else None
+                sources = data.get("sources")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Prerequisite graph unreadable: {e}")
+                graph, sources = None, None
+            _state.clear()
+            _state.update(mtime=mtime, graph=graph, sources=sources)
+        graph, sources = (_state.get("graph"), _state.get("sources")) if mtime is not None else (None, None)
+    if graph is not None:
+        try:
+            fresh = _sources(catalog_index.DEPARTMENTS_DIR) == sources
+        except OSError:
+            fresh = False
+        if not fresh:
+            logger.warning("Prerequisite graph older than departments/; run `python prereq_graph.py build`")
+            graph = None
+    with _lock:
+        _state.update(checked_at=now, check_seconds=freshness_check_seconds(), result=graph)
+    return graph
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("usage: python prereq_graph.py build"); sys.exit(1)
+    stats = build_graph_file()
+    print(f"Extracted {stats['edges']} prerequisite edges over {stats['courses']} courses -> {default_graph_path()} ({stats})")
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Sparse topic/term index over the real OCW catalog for mode="rank".
+
+`build_index` derives two sparse matrices from every course in departments/:
+  * course x topic — how strongly a course's title/description mention each
+    topic of script.TOPIC_SYNONYMS / TERMS2TOPICS (saturating weight in [0, 1));
+  * course x term  — l2-normalised tf-idf over title + description tokens.
+Both are stored column-wise (per topic / per term postings) in a SQLite file,
+so ranking a query is one sparse matrix-vector product over only the topics
+and terms the query actually touches.
+
+Built together with the catalog index (re-run after refreshing departments/
+or editing the topic tables):
+    python catalog_index.py build
+or on its own:
+    python rank_index.py build
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import sqlite3
+import threading
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import catalog_index
+from course_search import tokenize
+from env_loader import getenv
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def default_index_path() -> str:
+    """RANK_INDEX_PATH, read on use: the .env is loaded lazily, after import."""
+    return getenv("RANK_INDEX_PATH", os.path.join(HERE, "rank_index.sqlite"))
+
+
+TITLE_WEIGHT = 2   # phrase/term hits in the title count double
+TERM_WEIGHT = 0.5  # share of the final score coming from direct query-term matches
+CROSS_LISTING_SLACK = 16  # extra heap entries pulled per query to cover cross-listed duplicates
+
+SCHEMA = """
+CREATE TABLE courses (
+    doc        INTEGER PRIMARY KEY,
+    department TEXT NOT NULL,
+    coursenum  TEXT,
+    title      TEXT NOT NULL,
+    level      TEXT
+);
+CREATE TABLE topic_postings (
+    topic  TEXT NOT NULL,
+    doc    INTEGER NOT NULL,
+    weight REAL NOT NULL,
+    PRIMARY KEY (topic, doc)
+) WITHOUT ROWID;
+CREATE TABLE terms (
+    term TEXT PRIMARY KEY,
+    idf  REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE term_postings (
+    term   TEXT NOT NULL,
+    doc    INTEGER NOT NULL,
+    weight REAL NOT NULL,
+    PRIMARY KEY (term, doc)
+) WITHOUT ROWID;
+CREATE TABLE meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def topic_phrases(topic_synonyms: Dict[str, List[str]],
+                  terms2topics: Dict[str, List[Tuple[str, float]]]) -> Dict[str, List[Tuple[str, float]]]:
+    """{topic: [(phrase, weight)]}: the topic name and its synonyms at 1.0, TERMS2TOPICS keys at their weight."""
+    phrases = {topic: {topic: 1.0} for topic in topic_synonyms}
+    for topic, syns in topic_synonyms.items():
+        for s in syns:
+            phrases[topic][s] = 1.0
+    for key, pairs in terms2topics.items():
+        for topic, w in pairs:
+            if topic in phrases:
+                phrases[topic][key] = max(phrases[topic].get(key, 0.0), w)
+    return {t: sorted(p.items()) for t, p in phrases.items()}
+
+
+def fingerprint(topic_synonyms, terms2topics) -> str:
+    """Changes whenever the topic tables do, so a stale index is detected."""
+    material = json.dumps([topic_synonyms, terms2topics], sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def _phrase_re(phrase: str):
+    return re.compile(r"\b" + re.escape(phrase) + r"s?\b")
+
+
+def _topic_weights(title: str, description: str, compiled) -> Dict[str, float]:
+    title, description = title.lower(), description.lower()
+    out = {}
+    for topic, pats in compiled.items():
+        score = 0.0
+        for pat, w in pats:
+            hits = TITLE_WEIGHT * len(pat.findall(title)) + len(pat.findall(description))
+            score += w * hits
+        if score > 0:
+            out[topic] = 1.0 - math.exp(-score)
+    return out
+
+
+def build_index(topic_synonyms, terms2topics, departments_dir: str = None, index_path: str = None) -> int:
+    """Compile departments/*.json into the rank index. Returns the number of courses indexed."""
+    departments_dir = departments_dir or catalog_index.DEPARTMENTS_DIR
+    index_path = index_path or default_index_path()
+    tmp_path = index_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    compiled = {t: [(_phrase_re(p), w) for p, w in pats]
+                for t, pats in topic_phrases(topic_synonyms, terms2topics).items()}
+
+    courses, topic_rows, doc_terms = [], [], []
+    for fname in sorted(os.listdir(departments_dir)):
+        if not fname.endswith(".json"):
+            continue
+        department = fname[:-len(".json")]
+        with open(os.path.join(departments_dir, fname), "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        for course in raw:
+            c = catalog_index.compact_course(course, department)
+            doc = len(courses)
+            courses.append((doc, department, c["coursenum"], c["title"], c["level"]))
+            for topic, w in _topic_weights(c["title"], c["short_description"], compiled).items():
+                topic_rows.append((topic, doc, w))
+            tf = Counter(tokenize(c["short_description"]))
+            for tok in tokenize(c["title"]):
+                tf[tok] += TITLE_WEIGHT
+            doc_terms.append(tf)
+
+    n_docs = len(courses)
+    df = Counter(term for tf in doc_terms for term in tf)
+    idf = {term: math.log((1 + n_docs) / (1 + n)) + 1.0 for term, n in df.items()}
+    term_rows = []
+    for doc, tf in enumerate(doc_terms):
+        vec = {term: (1.0 + math.log(n)) * idf[term] for term, n in tf.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        term_rows.extend((term, doc, v / norm) for term, v in vec.items())
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT INTO courses VALUES (?, ?, ?, ?, ?)", courses)
+        conn.executemany("INSERT INTO topic_postings VALUES (?, ?, ?)", topic_rows)
+        conn.executemany("INSERT INTO terms VALUES (?, ?)", idf.items())
+        conn.executemany("INSERT INTO term_postings VALUES (?, ?, ?)", term_rows)
+        conn.execute("INSERT INTO meta VALUES ('topics', ?)", (fingerprint(topic_synonyms, terms2topics),))
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp_path, index_path)
+    with _lock:
+        _state.clear()
+    _local.__dict__.clear()
+    return n_docs
+
+
+# ---------- query side ----------
+# The course table and topic postings are small and read on every query, so
+# they live in memory; term postings are fetched per query from SQLite.
+_state: Dict = {}
+_lock = threading.Lock()
+_missing_logged = set()  # index paths already reported missing
+_local = threading.local()
+
+
+def _connection(mtime: int) -> sqlite3.Connection:
+    # Reopen after a rebuild: os.replace leaves old connections on the old file
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "mtime", None) != mtime:
+        if conn is not None:
+            conn.close()
+        conn = sqlite3.connect(f"file:{default_index_path()}?mode=ro", uri=True)
+        _local.conn, _local.mtime = conn, mtime
+    return conn
+
+
+def _load(expected_fingerprint: str) -> Optional[Dict]:
+    path = default_index_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        with _lock:
+            if path not in _missing_logged:
+                _missing_logged.add(path)
+                logger.warning(f"Rank index missing at {path}; mode=\"rank\" falls back to CATALOG "
+                               f"until `python catalog_index.py build` is run")
+        return None
+    with _lock:
+        if _state.get("mtime") == mtime:
+            return _state if _state.get("fresh") else None
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'topics'").fetchone()
+        fresh = row is not None and row[0] == expected_fingerprint
+        courses = [
+            {"id": f"{dept}:{num or doc}", "title": title, "coursenum": num,
+             "department": dept, "level": level}
+            for doc, dept, num, title, level in conn.execute(
+                "SELECT doc, department, coursenum, title, level FROM courses ORDER BY doc")
+        ]
+        topics = {}
+        for topic, doc, w in conn.execute("SELECT topic, doc, weight FROM topic_postings"):
+            topics.setdefault(topic, []).append((doc, w))
+    except sqlite3.Error as e:
+        logger.warning(f"Rank index unreadable: {e}")
+        return None
+    finally:
+        conn.close()
+    if not fresh:
+        logger.warning("Rank index built from different topic tables; run `python rank_index.py build`")
+    with _lock:
+        _state.clear()
+        _state.update(mtime=mtime, fresh=fresh, courses=courses, topics=topics)
+        return _state if fresh else None
+
+
+def _term_scores(query: str, mtime: int) -> Dict[int, float]:
+    terms = sorted(set(tokenize(query)))
+    if not terms:
+        return {}
+    conn = _connection(mtime)
+    marks = ",".join("?" * len(terms))
+    out: Dict[int, float] = {}
+    rows = conn.execute(
+        f"SELECT p.doc, p.weight * t.idf FROM term_postings p JOIN terms t ON t.term = p.term "
+        f"WHERE p.term IN ({marks})", terms)
+    for doc, w in rows:
+        out[doc] = out.get(doc, 0.0) + w
+    return out
+
+
+def top_courses(topic_scores: Dict[str, float], query: str, top_k: int,
+                topic_synonyms, terms2topics) -> Optional[List[Dict]]:
+    """
+    Top-k real courses for a topic-weight vector plus the raw query text, or
+    None when the index is missing or stale (the caller falls back to CATALOG).
+    """
+    state = _load(fingerprint(topic_synonyms, terms2topics))
+    if state is None:
+        return None
+
+    # course x topic (column postings) . topic_scores
+    scores: Dict[int, float] = {}
+    course_topics: Dict[int, List[Tuple[float, str]]] = {}
+    for topic, weight in topic_scores.items():
+        if weight <= 0:
+            continue
+        for doc, w in state["topics"].get(topic, ()):
+            scores[doc] = scores.get(doc, 0.0) + weight * w
+            course_topics.setdefault(doc, []).append((w, topic))
+
+    try:
+        term_scores = _term_scores(query, state["mtime"])
+    except sqlite3.Error as e:
+        logger.warning(f"Rank index unreadable: {e}")
+        term_scores = {}
+    if term_scores:
+        top_term = max(term_scores.values())
+        for doc, s in term_scores.items():
+            scores[doc] = scores.get(doc, 0.0) + TERM_WEIGHT * s / top_term
+
+    # Only the head of the ranking is needed; pull a few extra to absorb
+    # cross-listed duplicates, and widen to the full ranking if that wasn't enough.
+    rank_key = lambda kv: (-kv[1], kv[0])
+    ranked = heapq.nsmallest(top_k + CROSS_LISTING_SLACK, scores.items(), key=rank_key)
+    out = _distinct_courses(ranked, top_k, state, course_topics)
+    if len(out) < top_k and len(ranked) < len(scores):
+        out = _distinct_courses(sorted(scores.items(), key=rank_key), top_k, state, course_topics)
+    return out
+
+
+def _distinct_courses(ranked, top_k: int, state: Dict,
+                      course_topics: Dict[int, List[Tuple[float, str]]]) -> List[Dict]:
+    out, seen = [], set()
+    for doc, s in ranked:
+        if len(out) >= top_k:
+            break
+        course = dict(state["courses"][doc])
+        key = (course["title"].lower(), course["coursenum"])
+        if key in seen:
+            continue  # cross-listed in several departments
+        seen.add(key)
+        course["tags"] = [t for _, t in sorted(course_topics.get(doc, []), reverse=True)[:3]]
+        course["score"] = round(s, 4)
+        out.append(course)
+    return out
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("usage: python rank_index.py build"); sys.exit(1)
+    from script import TOPIC_SYNONYMS, TERMS2TOPICS
+    n = build_index(TOPIC_SYNONYMS, TERMS2TOPICS)
+    print(f"Indexed {n} courses -> {default_index_path()}")
@@ -1,51 +1,92 @@
-from typing import List, Dict, Tuple
-from dotenv import load_dotenv
-import psycopg
+from typing import List, Dict, Optional, Tuple
+import base64
+import json
 import os
-import numpy as np
-
-try:
-    from sklearn.neighbors import NearestNeighbors
-    SKLEARN = True
-except Exception:
-    SKLEARN = False
-
-# Load environment variables - try multiple paths and encodings
-env_paths = [
-    '../../frontend/.env',
-    '../.env', 
-    '.env'
-]
-
-env_loaded = False
-for env_path in env_paths:
-    if env_loaded:
-        break
-    for encoding in ['utf-16', 'utf-8', 'latin-1']:
-        try:
-            load_dotenv(dotenv_path=env_path, encoding=encoding)
-            env_loaded = True
-            break
-        except (UnicodeDecodeError, FileNotFoundError):
-            continue
-
-CFG = dict(
-    host=os.getenv("DB_HOST"),
-    port=os.getenv("DB_PORT"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    dbname=os.getenv("DB_NAME"),
-    sslmode=os.getenv("DB_SSLMODE", "require"),
-)
-
-def fetch_users_min():
-    with psycopg.connect(**CFG) as conn, conn.cursor() as cur:
-        cur.execute("SELECT id, email, name, interests FROM users ORDER BY created_at;")
-        return cur.fetchall()
+from psycopg.rows import dict_row
+import db_pool
+from env_loader import load_env
+from interest_index import INTEREST_INDEX
+from single_flight import FLIGHTS
+
+load_env()
+
+# Everything the people graph and the interest index need, in one round trip:
+# users with their experiences aggregated, plus the sync watermark. Backed off
+# a little so rows committed late by transactions that started earlier are
+# still seen by the next delta; re-applying a row is harmless.
+USERS_SQL = """
+    SELECT u.id, u.email, u.name, u.avatar_url, u.google_id, u.bio, u.interests,
+           u.created_at, u.updated_at,
+           COALESCE(json_agg(json_build_object('skill', e.skill, 'years', e.years_of_experience))
+                    FILTER (WHERE e.id IS NOT NULL), '[]') AS experiences,
+           now() - interval '30 seconds' AS watermark
+    FROM users u
+    LEFT JOIN user_experiences e ON e.id = u.id
+    GROUP BY u.id
+    ORDER BY u.created_at;
+"""
+
+def _fetch_users() -> Tuple[List[Dict], object]:
+    with db_pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(USERS_SQL)
+        rows = cur.fetchall()
+        if rows:
+            return rows, rows[0]["watermark"]
+        cur.execute("SELECT now() - interval '30 seconds' AS watermark;")
+        return rows, cur.fetchone()["watermark"]
+
+def fetch_users() -> Tuple[List[Dict], object]:
+    """(user dicts in created_at order, DB watermark). A burst of people_graph requests shares one scan; treat as read-only."""
+    return FLIGHTS.do("users", _fetch_users)
+
+# The interest index lives as long as the worker: a full users scan at most
+# every INTEREST_INDEX_REBUILD_SECONDS (also catches deleted users), otherwise
+# only rows created/updated since the last sync, at most every REFRESH seconds.
+INTEREST_INDEX_REFRESH_SECONDS = float(os.getenv("INTEREST_INDEX_REFRESH_SECONDS", "5"))
+INTEREST_INDEX_REBUILD_SECONDS = float(os.getenv("INTEREST_INDEX_REBUILD_SECONDS", "600"))
+
+def _changed_since(user: Dict, since) -> bool:
+    return any(t is not None and t >= since for t in (user["updated_at"], user["created_at"]))
+
+def _sync_interest_index(kind: str, users: Optional[Tuple[List[Dict], object]] = None):
+    """Sync from `users` (a fetch_users() result) when the caller already has them, else query."""
+    full = kind == "full" or INTEREST_INDEX.watermark is None
+    if users is not None:
+        rows, watermark = users
+        if full:
+            INTEREST_INDEX.load([(u["id"], u["interests"]) for u in rows], watermark)
+        else:
+            since = INTEREST_INDEX.watermark
+            INTEREST_INDEX.apply([(u["id"], u["interests"]) for u in rows if _changed_since(u, since)], watermark)
+        return
+    with db_pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT now() - interval '30 seconds';")
+        watermark = cur.fetchone()[0]
+        if full:
+            cur.execute("SELECT id, interests FROM users ORDER BY created_at;")
+            INTEREST_INDEX.load(cur.fetchall(), watermark)
+        else:
+            cur.execute("""
+                SELECT id, interests FROM users
+                WHERE updated_at >= %s OR created_at >= %s
+                ORDER BY created_at;
+            """, (INTEREST_INDEX.watermark, INTEREST_INDEX.watermark))
+            INTEREST_INDEX.apply(cur.fetchall(), watermark)
+
+def interest_index(force: str = None, users: Optional[Tuple[List[Dict], object]] = None):
+    """
+    INTEREST_INDEX, synced first when due (or when `force` is "full" / "delta").
+    Pass a fetch_users() result as `users` to sync from those rows instead of querying.
+    """
+    kind = force or INTEREST_INDEX.due(INTEREST_INDEX_REFRESH_SECONDS, INTEREST_INDEX_REBUILD_SECONDS)
+    if kind:
+        # Concurrent requests wait for one sync instead of each querying
+        FLIGHTS.do(("interest_index", kind), lambda: _sync_interest_index(kind, users))
+    return INTEREST_INDEX
 
 def fetch_roadmap_levels_for_users(user_ids: List[str]) -> Dict[str, Dict[str, int]]:
     if not user_ids: return {}
-    with psycopg.connect(**CFG) as conn, conn.cursor() as cur:
+    with db_pool.connection() as conn, conn.cursor() as cur:
         cur.execute("""
             SELECT user_id, title, COALESCE((data->>'level')::int, 0) AS lvl
             FROM roadmap_nodes
@@ -56,57 +97,32 @@ def fetch_roadmap_levels_for_users(user_ids: List[str]) -> Dict[str, Dict[str, i
             out.setdefault(uid, {})[title] = int(lvl or 0)
         return out
 
-def build_interest_vocab(users_rows) -> List[str]:
-    vocab = set()
-    for _,_,_, interests in users_rows:
-        if interests:
-            vocab.update(interests)
-    return sorted(vocab)
-
-def users_to_matrix(users_rows, vocab: List[str]) -> Tuple[np.ndarray, List[str]]:
-    idx = {t:i for i,t in enumerate(vocab)}
-    X = np.zeros((len(users_rows), len(vocab)), dtype=float)
-    ids = []
-    for r, (uid, email, name, interests) in enumerate(users_rows):
-        ids.append(uid)
-        if interests:
-            for t in interests:
-                if t in idx:
-                    X[r, idx[t]] = 1.0
-    norms = np.linalg.norm(X, axis=1, keepdims=True)
-    norms[norms==0] = 1.0
-    X = X / norms
-    return X, ids
-
-def find_matches_by_interests(target_user_id: str, k: int = 5) -> List[Tuple[str, float]]:
-    users = fetch_users_min()
-    if not users: return []
-    vocab = build_interest_vocab(users)
-    X, ids = users_to_matrix(users, vocab)
-    if target_user_id not in ids:
-        raise ValueError(f"User {target_user_id} not found.")
-    t_idx = ids.index(target_user_id)
-    if SKLEARN and X.shape[0] > 1:
-        nn = NearestNeighbors(n_neighbors=min(k+1, X.shape[0]), metric="cosine")
-        nn.fit(X)
-        distances, indices = nn.kneighbors(X[t_idx:t_idx+1], return_distance=True)
-        pairs = [(ids[j], 1.0 - float(dist)) for dist, j in zip(distances[0], indices[0]) if j != t_idx]
-    else:
-        sims = (X @ X[t_idx])
-        pairs = [(ids[j], float(sims[j])) for j in range(len(ids)) if j != t_idx]
-        pairs.sort(key=lambda x: x[1], reverse=True)
-        pairs = pairs[:k]
-    pairs.sort(key=lambda x: x[1], reverse=True)
-    return pairs[:k]
+def find_matches_for_users(target_user_ids: List[str], k: int = 5,
+                           users: Optional[Tuple[List[Dict], object]] = None) -> Dict[str, List[Tuple[str, float]]]:
+    """Top-k interest matches for several users in one pass over the index (synced from `users` if given)."""
+    index = interest_index(users=users)
+    if not len(index): return {uid: [] for uid in target_user_ids}
+    if any(uid not in index for uid in target_user_ids):
+        # Signed up after the last sync: pick up the new rows once before giving up
+        index = interest_index(force="delta", users=users)
+        missing = [uid for uid in target_user_ids if uid not in index]
+        if missing:
+            raise ValueError(f"User {missing[0]} not found.")
+    return index.top_k_many(target_user_ids, k)
+
+def find_matches_by_interests(target_user_id: str, k: int = 5,
+                              users: Optional[Tuple[List[Dict], object]] = None) -> List[Tuple[str, float]]:
+    return find_matches_for_users([target_user_id], k, users)[target_user_id]
 
 def pretty_print_matches(target_user_id: str, k: int = 5):
-    users = fetch_users_min()
-    id2user = {uid: (email, name, interests) for uid, email, name, interests in users}
-    matches = find_matches_by_interests(target_user_id, k=k)
-    print(f"\nBest {k} matches for {id2user[target_user_id][1] or id2user[target_user_id][0]} ({target_user_id}):")
+    users = fetch_users()
+    by_id = {u["id"]: u for u in users[0]}
+    matches = find_matches_by_interests(target_user_id, k=k, users=users)
+    target = by_id[target_user_id]
+    print(f"\nBest {k} matches for {target['name'] or target['email']} ({target_user_id}):")
     for uid, score in matches:
-        email, name, interests = id2user[uid]
-        print(f"  - {name or email:24s}  sim={score:.3f}  interests={interests}")
+        u = by_id[uid]
+        print(f"  - {u['name'] or u['email']:24s}  sim={score:.3f}  interests={u['interests']}")
 
 def get_people_graph_data(current_user_google_id: str):
     """
@@ -114,62 +130,18 @@ def get_people_graph_data(current_user_google_id: str):
     Returns data suitable for D3.js visualization.
     """
     try:
-        # Import here to avoid circular imports
-        import psycopg
-        from urllib.parse import urlparse
-        import os
-        from dotenv import load_dotenv
-        
-        # Environment variables already loaded at module level
-        
-        # Database connection using individual environment variables (same as backend)
-        db_config = {
-            'host': os.getenv("DB_HOST"),
-            'port': os.getenv("DB_PORT"),
-            'user': os.getenv("DB_USER"),
-            'password': os.getenv("DB_PASSWORD"),
-            'dbname': os.getenv("DB_NAME"),
-            'sslmode': os.getenv("DB_SSLMODE", "require")
-        }
-        
-        # Check if we have the required config
-        missing_vars = [k for k, v in db_config.items() if not v and k != 'sslmode']
-        if missing_vars:
-            raise ValueError(f"Missing database environment variables: {missing_vars}")
-        
-        # Fetch all users from PostgreSQL
-        with psycopg.connect(**db_config) as conn:
-            with conn.cursor() as cur:
-                # Get all users with their basic info
-                cur.execute("""
-                    SELECT id, email, name, avatar_url, google_id, bio, created_at
-                    FROM users 
-                    ORDER BY created_at DESC
-                """)
-                users_data = cur.fetchall()
-                
-                # Get user experiences (interests) - assuming this table structure
-                cur.execute("""
-                    SELECT id, skill, years_of_experience
-                    FROM user_experiences
-                """)
-                experiences_data = cur.fetchall()
+        # One round trip; the same rows feed the interest index for the KNN step
+        users = fetch_users()
         
         # Process users data
         vertices = []
         user_lookup = {}
         current_user_internal_id = None
         
-        # Create a mapping of experiences by user ID
-        experiences_by_user = {}
-        for user_id, skill, years in experiences_data:
-            if user_id not in experiences_by_user:
-                experiences_by_user[user_id] = []
-            experiences_by_user[user_id].append({"skill": skill, "years": years})
-        
-        for user_id, email, name, avatar_url, google_id, bio, created_at in users_data:
-            user_interests = experiences_by_user.get(user_id, [])
-            interest_names = [exp["skill"] for exp in user_interests]
+        # Newest first, as before
+        for u in reversed(users[0]):
+            user_id, google_id = u["id"], u["google_id"]
+            interest_names = [exp["skill"] for exp in u["experiences"]]
             
             # Check if this is the current user
             is_current_user = google_id == current_user_google_id
@@ -179,13 +151,13 @@ def get_people_graph_data(current_user_google_id: str):
             user_node = {
                 "id": user_id,
                 "google_id": google_id,
-                "name": name or email,
-                "email": email,
-                "avatar_url": avatar_url,
-                "bio": bio,
+                "name": u["name"] or u["email"],
+                "email": u["email"],
+                "avatar_url": u["avatar_url"],
+                "bio": u["bio"],
                 "interests": interest_names,
                 "is_current_user": is_current_user,
-                "created_at": str(created_at) if created_at else None
+                "created_at": str(u["created_at"]) if u["created_at"] else None
             }
             
             vertices.append(user_node)
@@ -198,7 +170,7 @@ def get_people_graph_data(current_user_google_id: str):
         if current_user_internal_id and len(vertices) > 1:
             try:
                 # Use the existing KNN function
-                matches = find_matches_by_interests(current_user_internal_id, k=min(5, len(vertices)-1))
+                matches = find_matches_by_interests(current_user_internal_id, k=min(5, len(vertices)-1), users=users)
                 
                 for match_user_id, similarity in matches:
                     if match_user_id in user_lookup:
@@ -243,12 +215,179 @@ def get_people_graph_data(current_user_google_id: str):
             "top_5_closest": []
         }
 
+# ---------- neighborhood mode ----------
+# Only the current user's similarity neighborhood: breadth-first over each
+# user's top-k interest matches, one page of vertices at a time.
+PEOPLE_GRAPH_MAX_HOPS = int(os.getenv("PEOPLE_GRAPH_MAX_HOPS", "3"))
+PEOPLE_GRAPH_MAX_K = int(os.getenv("PEOPLE_GRAPH_MAX_K", "10"))
+PEOPLE_GRAPH_MAX_LIMIT = int(os.getenv("PEOPLE_GRAPH_MAX_LIMIT", "200"))
+
+# "light" is what the graph needs to draw a node; "full" adds the profile panel fields
+PEOPLE_PROJECTIONS = {
+    "light": """
+        SELECT u.id, COALESCE(u.name, split_part(u.email, '@', 1)) AS name, u.avatar_url
+        FROM users u
+        WHERE u.id = ANY(%s);
+    """,
+    "full": """
+        SELECT u.id, u.google_id, COALESCE(u.name, u.email) AS name, u.email, u.avatar_url, u.bio, u.created_at,
+               COALESCE(json_agg(e.skill) FILTER (WHERE e.id IS NOT NULL), '[]') AS interests
+        FROM users u
+        LEFT JOIN user_experiences e ON e.id = u.id
+        WHERE u.id = ANY(%s)
+        GROUP BY u.id;
+    """,
+}
+
+def _clamp(value, default: int, high: int) -> int:
+    try:
+        return max(1, min(int(value), high))
+    except (TypeError, ValueError):
+        return default
+
+def _encode_cursor(state: Dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Dict:
+    """The cursor's state with hops / k held to the same caps as fresh arguments."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset = state["o"]
+        if type(offset) is not int or offset < 0 or not isinstance(state["r"], str):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    state["h"] = _clamp(state.get("h"), 2, PEOPLE_GRAPH_MAX_HOPS)
+    state["k"] = _clamp(state.get("k"), 5, PEOPLE_GRAPH_MAX_K)
+    return state
+
+def _neighborhood(root, hops: int, k: int, need: int):
+    """
+    (ids in breadth-first order with their hop, {id: top-k matches}) for at
+    least `need` ids when the neighborhood has that many. Matches with
+    similarity 0 are padding, not neighbors. Every returned id is expanded,
+    so edges among them are complete.
+    """
+    order, hop = [root], {root: 0}
+    matches: Dict = {}
+    level = [root]
+    while level and len(order) < need:
+        matches.update(find_matches_for_users(level, k))
+        if hop[level[0]] >= hops:
+            break
+        next_level = []
+        for u in level:
+            for v, sim in matches[u]:
+                if sim > 0 and v not in hop:
+                    hop[v] = hop[u] + 1
+                    order.append(v)
+                    next_level.append(v)
+        level = next_level
+    pending = [u for u in order[:need] if u not in matches]
+    if pending:
+        matches.update(find_matches_for_users(pending, k))
+    return order, hop, matches
+
+def get_people_neighborhood(current_user_google_id: str, hops: int = 2, k: int = 5, limit: int = 50,
+                            cursor: Optional[str] = None, projection: str = "light"):
+    """
+    The people graph limited to the current user's k-hop similarity
+    neighborhood, `limit` vertices per page in breadth-first order (the
+    current user first). Each page carries the edges whose later endpoint is
+    on it, so concatenating pages gives the whole neighborhood; `next_cursor`
+    (None on the last page) continues where the page ended. Only the page's
+    users are read from the database, so the response size does not depend on
+    how many users there are. `projection` is "light" or "full".
+
+    Every page re-runs the breadth-first search, so a cursor only continues
+    on the index version it was issued for; once the index has changed it is
+    rejected and the client starts over without one.
+    """
+    try:
+        if projection not in PEOPLE_PROJECTIONS:
+            raise ValueError(f"Unknown projection {projection!r}; use 'light' or 'full'.")
+        limit = _clamp(limit, 50, PEOPLE_GRAPH_MAX_LIMIT)
+        if cursor:
+            state = _decode_cursor(cursor)
+            if state.get("g") != current_user_google_id:
+                raise ValueError("Cursor belongs to another user")
+            root = interest_index().parse_id(state["r"])
+            offset, hops, k, version = state["o"], state["h"], state["k"], state.get("v")
+        else:
+            hops = _clamp(hops, 2, PEOPLE_GRAPH_MAX_HOPS)
+            k = _clamp(k, 5, PEOPLE_GRAPH_MAX_K)
+            with db_pool.connection() as conn, conn.cursor() as cur:
+                cur.execute("SELECT id FROM users WHERE google_id = %s;", (current_user_google_id,))
+                row = cur.fetchone()
+            if not row:
+                raise ValueError(f"User {current_user_google_id} not found.")
+            root, offset = row[0], 0
+            version = interest_index().version
+
+        end = offset + limit
+        order, hop, matches = _neighborhood(root, hops, k, end + 1)
+        # checked after the search too: a sync during it may have changed the answer
+        if cursor and INTEREST_INDEX.version != version:
+            raise ValueError("Cursor expired: the people graph changed since the first page; request it again without a cursor")
+        page = order[offset:end]
+        position = {u: i for i, u in enumerate(order[:end])}
+
+        edges, seen = [], set()
+        for u in order[:end]:
+            for v, sim in matches[u]:
+                i = max(position[u], position.get(v, end))
+                pair = frozenset((u, v))
+                if sim > 0 and offset <= i < end and pair not in seen:
+                    seen.add(pair)
+                    edges.append({"source": str(u), "target": str(v), "similarity": sim, "type": "similarity"})
+
+        users: Dict = {}
+        if page:
+            with db_pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+                cur.execute(PEOPLE_PROJECTIONS[projection], (page,))
+                users = {u["id"]: u for u in cur.fetchall()}
+        vertices = []
+        for uid in page:
+            u = users.get(uid)
+            if u is None:  # deleted since the index last synced
+                continue
+            vertex = {**u, "id": str(uid), "hop": hop[uid], "is_current_user": uid == root}
+            if "created_at" in vertex:
+                vertex["created_at"] = str(vertex["created_at"]) if vertex["created_at"] else None
+            vertices.append(vertex)
+        by_id = {v["id"]: v for v in vertices}
+
+        more = len(order) > end
+        return {
+            "vertices": vertices,
+            "edges": edges,
+            "current_user_id": str(root),
+            "current_user_google_id": current_user_google_id,
+            "top_5_closest": [{"user_id": str(v), "user": by_id[str(v)], "similarity": sim}
+                              for v, sim in matches[root][:5] if sim > 0 and str(v) in by_id],
+            "total_users": len(INTEREST_INDEX),
+            "hops": hops,
+            "k": k,
+            "next_cursor": _encode_cursor({"g": current_user_google_id, "r": str(root),
+                                           "o": end, "h": hops, "k": k, "v": version}) if more else None,
+        }
+
+    except Exception as e:
+        return {
+            "error": f"Failed to get people graph data: {str(e)}",
+            "vertices": [],
+            "edges": [],
+            "current_user_id": None,
+            "top_5_closest": [],
+            "next_cursor": None
+        }
+
 if __name__ == "__main__":
-    rows = fetch_users_min()
+    rows, _ = fetch_users()
     target = None
-    for uid, email, name, _ in rows:
-        if email == "alice@example.com":
-            target = uid; break
+    for u in rows:
+        if u["email"] == "alice@example.com":
+            target = u["id"]; break
     if not target:
-        target = rows[-1][0]
+        target = rows[-1]["id"]
     pretty_print_matches(target_user_id=target, k=8)
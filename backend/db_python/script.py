@@ -1,64 +1,62 @@
 # script.py  — dynamic AI questions + verdict
-# pip install "psycopg[binary]" python-dotenv anthropic
-import os, sys, json, hashlib, logging
-from dotenv import load_dotenv
-from course_recommender import generate_course_roadmap
+# pip install "psycopg[binary,pool]" python-dotenv anthropic
+import os, sys, json, hashlib, logging, asyncio
+from env_loader import load_env, getenv
+
+# Heavy dependencies (anthropic via course_recommender, numpy/psycopg via
+# read_db) are imported inside the modes that need them, so e.g. "rank"
+# starts with nothing but the standard library.
 
 # Suppress HTTP request logging from httpx (used by Anthropic client)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 # Suppress course_recommender INFO logs
 logging.getLogger("course_recommender").setLevel(logging.WARNING)
 
-# Load environment variables - try multiple paths and encodings
-env_paths = [
-    '../../frontend/.env',
-    '../.env', 
-    '.env'
-]
-
-env_loaded = False
-for env_path in env_paths:
-    if env_loaded:
-        break
-    for encoding in ['utf-16', 'utf-8', 'latin-1']:
-        try:
-            load_dotenv(dotenv_path=env_path, encoding=encoding)
-            env_loaded = True
-            break
-        except (UnicodeDecodeError, FileNotFoundError):
-            continue
+# Models: fast model for QUESTIONS, higher-quality for VERDICT
+def _model_questions():
+    return getenv("ANTHROPIC_MODEL_QUESTIONS", "claude-3-haiku-20240307")
 
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-USE_LLM = bool(ANTHROPIC_API_KEY)
+def _model_verdict():
+    return getenv("ANTHROPIC_MODEL_VERDICT", "claude-sonnet-4-20250514")
 
-# Models: fast model for QUESTIONS, higher-quality for VERDICT
-MODEL_QUESTIONS = os.getenv("ANTHROPIC_MODEL_QUESTIONS", "claude-3-haiku-20240307")
-MODEL_VERDICT   = os.getenv("ANTHROPIC_MODEL_VERDICT", "claude-sonnet-4-20250514")
+def _use_llm():
+    return bool(getenv("ANTHROPIC_API_KEY"))
 
 def _require_llm():
-    if not USE_LLM:
+    if not _use_llm():
         raise RuntimeError("Missing ANTHROPIC_API_KEY; cannot generate questions with AI.")
 
+_CLIENT = None
+
 def _anthropic_client():
-    from anthropic import Anthropic
-    return Anthropic(api_key=ANTHROPIC_API_KEY)
+    # One client per process: a --serve worker reuses its connection pool
+    global _CLIENT
+    if _CLIENT is None:
+        from anthropic import Anthropic
+        _CLIENT = Anthropic(api_key=getenv("ANTHROPIC_API_KEY"))
+    return _CLIENT
+
+_ASYNC_CLIENT = None  # (event loop, AsyncAnthropic)
 
-def _llm_json(client, model, prompt, max_tokens=500):
+def _async_anthropic_client():
     """
-    Ask the model for STRICT JSON (single object). If it returns any text,
-    try to extract the first {...} block.
+    Shared AsyncAnthropic for the running event loop. Its HTTP connections are
+    tied to the loop, so a new loop (e.g. a one-shot asyncio.run) gets a new client.
     """
-    sys_msg = (
-        "You are a fast JSON generator. Return ONLY valid, minified JSON. "
-        "No prose, no backticks."
-    )
-    resp = client.messages.create(
-        model=model,
-        max_tokens=max_tokens,
-        system=sys_msg,
-        messages=[{"role":"user","content":prompt}]
-    )
-    text = resp.content[0].text.strip()
+    global _ASYNC_CLIENT
+    loop = asyncio.get_running_loop()
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT[0] is not loop:
+        from anthropic import AsyncAnthropic
+        _ASYNC_CLIENT = (loop, AsyncAnthropic(api_key=getenv("ANTHROPIC_API_KEY")))
+    return _ASYNC_CLIENT[1]
+
+_JSON_SYSTEM = (
+    "You are a fast JSON generator. Return ONLY valid, minified JSON. "
+    "No prose, no backticks."
+)
+
+def _parse_llm_json(text: str):
+    text = text.strip()
     # Try strict JSON first
     try:
         return json.loads(text)
@@ -70,10 +68,64 @@ def _llm_json(client, model, prompt, max_tokens=500):
             return json.loads(text[start:end+1])
         raise
 
+def _llm_json(client, model, prompt, max_tokens=500, cache=True):
+    """
+    Ask the model for STRICT JSON (single object). If it returns any text,
+    try to extract the first {...} block. Responses that parse are stored in
+    the on-disk LLM cache; pass cache=False to always ask the model.
+    Concurrent identical cached requests share one call (single_flight.FLIGHTS);
+    a cache=False call is never merged, it always gets its own completion.
+    """
+    from llm_cache import LLM_CACHE
+    from single_flight import FLIGHTS
+    key = LLM_CACHE.key(model=model, system=_JSON_SYSTEM, prompt=prompt, max_tokens=max_tokens)
+
+    def fetch():
+        text = LLM_CACHE.get(key) if cache else None
+        if text is None:
+            resp = client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                system=_JSON_SYSTEM,
+                messages=[{"role":"user","content":prompt}]
+            )
+            text = resp.content[0].text
+            _parse_llm_json(text)  # only text that parses is cached
+            if cache:
+                LLM_CACHE.put(key, text)
+        return text
+
+    # Each caller parses its own copy, so nobody shares a mutable dict
+    return _parse_llm_json(FLIGHTS.do(("llm_json", key), fetch) if cache else fetch())
+
+async def _allm_json(client, model, prompt, max_tokens=500, cache=True):
+    """Async _llm_json for an AsyncAnthropic client."""
+    from llm_cache import LLM_CACHE
+    from single_flight import FLIGHTS
+    key = LLM_CACHE.key(model=model, system=_JSON_SYSTEM, prompt=prompt, max_tokens=max_tokens)
+
+    async def fetch():
+        text = LLM_CACHE.get(key) if cache else None
+        if text is None:
+            resp = await client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                system=_JSON_SYSTEM,
+                messages=[{"role":"user","content":prompt}]
+            )
+            text = resp.content[0].text
+            _parse_llm_json(text)
+            if cache:
+                LLM_CACHE.put(key, text)
+        return text
+
+    return _parse_llm_json(await FLIGHTS.ado(("llm_json", key), fetch) if cache else await fetch())
+
 # ---------- AI QUESTIONS ----------
 def generate_questions(seed: dict) -> dict:
     """
-    seed keys (optional): interests_hint (list[str] or str), count_min, count_max, language
+    seed keys (optional): interests_hint (list[str] or str), count_min, count_max, language,
+                          cache (bool, default true; false skips the LLM response cache)
     """
     _require_llm()
     client = _anthropic_client()
@@ -100,7 +152,7 @@ Constraints:
 - Keep text concise. No explanations, only JSON.
 """
 
-    obj = _llm_json(client, MODEL_QUESTIONS, prompt, max_tokens=450)
+    obj = _llm_json(client, _model_questions(), prompt, max_tokens=450, cache=bool(seed.get("cache", True)))
 
     # Clamp question count (safety)
     qs = obj.get("questions", [])
@@ -167,9 +219,6 @@ CATALOG = [
   {"id":"instructional_design","title":"Instructional Design & Learning Technology","tags":["education","design"],"level":2},
 ]
 
-def _hours_score(s):
-    return {"<2h":0,"2–4h":1,"5–7h":2,"8–12h":3,"13+h":4}.get(s,1)
-
 def _estimate_levels(ans):
     base = {"math":0,"programming":0,"study":0}
     m = ans.get("self", {})  # e.g., {"math":2,"programming":3,"study":1}
@@ -184,41 +233,36 @@ def _estimate_levels(ans):
     for k in base: base[k] = max(0,min(4,base[k]))
     return base
 
-def _score(course, interests, levels, goal, hrs):
-    if not set(interests).intersection(course["tags"]):
-        return -1e9
-    score = 2.0 * len(set(interests).intersection(course["tags"]))
-    # align level
-    if "ml" in course["tags"] or "ai" in course["tags"] or "nlp" in course["tags"]:
-        lvl = 0.5*levels["math"] + 0.5*levels["programming"]
-    elif "math" in course["tags"]:
-        lvl = levels["math"]
-    elif "cs" in course["tags"] or "web" in course["tags"]:
-        lvl = levels["programming"]
-    elif "data" in course["tags"] or "stats" in course["tags"]:
-        lvl = 0.5*levels["math"] + 0.5*levels["study"]
-    elif "astronomy" in course["tags"] or "physics" in course["tags"]:
-        lvl = 0.7*levels["math"] + 0.3*levels["study"]
-    elif "biology" in course["tags"]:
-        lvl = 0.5*levels["study"] + 0.5*levels["programming"]
-    elif "art" in course["tags"] or "history" in course["tags"]:
-        lvl = levels["study"]
-    else:
-        lvl = 0.5*levels["programming"] + 0.5*levels["study"]
-    score += 1.5 * (1.0 - min(1.5, abs(course["level"] - lvl))/1.5)
-    if goal in ["build projects","career switch"] and course["id"] in ["ml_projects","web_fullstack","data_analytics"]:
-        score += 1.0
-    if goal in ["get foundations","pass a class"] and course["id"] in ["math_found","python_intro","lin_alg","ds_algo","astronomy_intro","physics_intro"]:
-        score += 1.0
-    if goal == "research prep" and course["id"] in ["nlp_intro","lin_alg","econ_data","astrophysics","stellar_evolution"]:
-        score += 0.7
-    # Boost astronomy courses if astronomy is in interests
-    if "astronomy" in interests and "astronomy" in course["tags"]:
-        score += 1.5
-    score += 0.1 * _hours_score(hrs)
-    return score
-
-def make_verdict(payload: dict) -> dict:
+# CATALOG encoded once as arrays (verdict_scoring.py); one user or a whole cohort
+# is scored against every course in a single vectorised pass
+_COMPILED_CATALOG = None
+
+def _compiled_catalog():
+    global _COMPILED_CATALOG
+    if _COMPILED_CATALOG is None:
+        from verdict_scoring import CompiledCatalog
+        _COMPILED_CATALOG = CompiledCatalog(CATALOG)
+    return _COMPILED_CATALOG
+
+def _verdict_inputs(payload: dict):
+    """(interests, levels, goal, hours) for one questionnaire submission."""
+    interests = list(dict.fromkeys((payload.get("top3") or []) + (payload.get("interests") or [])))
+    return interests, _estimate_levels(payload), payload.get("goal",""), payload.get("hours","")
+
+def score_submissions(payloads: list, top_k: int = 5) -> list:
+    """
+    Heuristic top picks (no LLM) for many questionnaire submissions at once,
+    e.g. re-scoring a cohort after a CATALOG change. Returns one list of
+    course ids per submission, best first.
+    """
+    catalog = _compiled_catalog()
+    rows = [_verdict_inputs(p) for p in payloads]
+    users = catalog.encode_users(*(list(col) for col in zip(*rows))) if rows else None
+    if users is None:
+        return []
+    return [[c["id"] for c in picks] for picks in catalog.top_picks(users, k=top_k)]
+
+def make_verdict(payload: dict, roadmap_engine: str = None) -> dict:
     """
     payload example:
     {
@@ -230,17 +274,141 @@ def make_verdict(payload: dict) -> dict:
       "quiz": {"math": true, "data": true, "cs": true}
     }
     """
-    interests = list(dict.fromkeys((payload.get("top3") or []) + (payload.get("interests") or [])))
-    levels = _estimate_levels(payload)
-    goal = payload.get("goal","")
-    hours = payload.get("hours","")
+    return asyncio.run(amake_verdict(payload, roadmap_engine=roadmap_engine))
+
+# Per-stage budgets (seconds) for amake_verdict; roadmap stages live in
+# course_recommender.roadmap_stage_deadlines() and can be overridden the same way.
+# "total" bounds the whole stage graph: whatever is unfinished by then falls back,
+# and "fallback" bounds a fallback that has to compute something (the local roadmap).
+# Read per call (like _model_verdict) so values from the lazily loaded .env apply.
+def verdict_stage_deadlines() -> dict:
+    return {
+        "advisor_pack": float(getenv("VERDICT_DEADLINE_ADVISOR_PACK", "25")),
+        "polish":       float(getenv("VERDICT_DEADLINE_POLISH", "10")),
+        "total":        float(getenv("VERDICT_DEADLINE_TOTAL", "60")),
+        "fallback":     float(getenv("VERDICT_DEADLINE_FALLBACK", "5")),
+    }
 
-    scored = []
-    for c in CATALOG:
-        s = _score(c, interests, levels, goal, hours)
-        if s > -1e8: scored.append((s,c))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    picks = [c for _,c in scored[:5]]
+async def amake_verdict(payload: dict, deadlines: dict = None, emit=None, roadmap_engine: str = None) -> dict:
+    """
+    make_verdict as a small graph of asyncio stages (stage_scheduler) on the
+    shared AsyncAnthropic client, so a --serve worker can run many verdicts
+    concurrently:
+
+        advisor_pack -> roadmap -> output
+        polish (summary + picks only) -----^
+
+    The polish runs alongside the advisor pack and roadmap. `deadlines`
+    overrides verdict_stage_deadlines() / roadmap_stage_deadlines() per stage; a
+    stage that runs late falls back (template advisor pack, the departments
+    finished so far, no rationales) and is listed in out["partial"].
+
+    The roadmap comes from the LLM pipeline, or from local_roadmap (catalog
+    only, no API calls) when `roadmap_engine` (default roadmap_engine()) is
+    "local" or there is no API key. An LLM roadmap that fails or finishes no
+    department in time also falls back to the local one.
+
+    `emit`, if given, receives each part as soon as it is ready: summary
+    (+ heuristic picks) first, then advisor_pack, departments,
+    department_courses (one per department) and graph in that order, with
+    rationales whenever the polish finishes.
+    """
+    from stage_scheduler import Stage, run_stages
+    from course_recommender import roadmap_engine as default_roadmap_engine
+    from local_roadmap import generate_local_roadmap
+    emit = emit or (lambda event: None)
+    limits = {**verdict_stage_deadlines(), **(deadlines or {})}
+    plan = _verdict_plan(payload)
+    emit({"event": "summary", "summary": _verdict_summary(plan), "recommendations": plan["picks"]})
+    seed = plan["advisor_seed"]
+    engine = roadmap_engine or default_roadmap_engine()
+
+    def emit_advisor_pack(pack):
+        emit({"event": "advisor_pack", **{k: pack.get(k) for k in
+                                          ("advisor_description", "conversation_transcript", "skill_levels")}})
+        return pack
+
+    # LLM errors and the stage deadline both land on the stage fallback (the
+    # template pack), so a late or failed pack shows up in out["partial"]
+    async def advisor_pack():
+        inp = _advisor_pack_inputs(seed)
+        if not _use_llm():
+            return emit_advisor_pack(_advisor_pack_fallback(inp))
+        obj = await _allm_json(_async_anthropic_client(), _model_verdict(), inp["prompt"], max_tokens=600)
+        return emit_advisor_pack(_advisor_pack_from_llm(obj, inp["levels"]))
+
+    async def polish():
+        if not _use_llm():
+            return None
+        resp = await _async_anthropic_client().messages.create(**_polish_request(plan))
+        rationales = json.loads(resp.content[0].text.strip()).get("rationales")
+        if rationales:
+            emit({"event": "rationales", "rationales": rationales})
+        return rationales
+
+    selected = []  # department courses as they arrive, for a partial roadmap
+
+    def roadmap_emit(event):
+        if event.get("event") == "department_courses":
+            selected.extend(event.get("courses") or [])
+        emit(event)
+
+    def roadmap_args(advisor_pack):
+        return (
+            advisor_pack.get("advisor_description", ""),
+            advisor_pack.get("conversation_transcript", ""),
+            advisor_pack.get("skill_levels", []),
+        )
+
+    # The roadmap travels as one course_graph dict (built once, integer ids)
+    async def roadmap(advisor_pack):
+        if engine == "local" or not _use_llm():
+            return await asyncio.to_thread(generate_local_roadmap, *roadmap_args(advisor_pack), as_graph=True)
+        from course_recommender import agenerate_course_roadmap
+        graph = await agenerate_course_roadmap(
+            *roadmap_args(advisor_pack), _async_anthropic_client(), deadlines=limits, emit=roadmap_emit,
+            as_graph=True)
+        if not graph["nodes"]:
+            raise RuntimeError("LLM roadmap came back empty")
+        return graph
+
+    # Runs after a deadline, while other verdicts share the loop: keep it in a thread
+    async def partial_roadmap(advisor_pack):
+        if selected:
+            from course_recommender import roadmap_graph_from_courses
+            return await asyncio.to_thread(roadmap_graph_from_courses, list(selected))
+        # nothing usable from the LLM in time: the catalog-only roadmap instead
+        return await asyncio.to_thread(generate_local_roadmap, *roadmap_args(advisor_pack or {}), as_graph=True)
+
+    def assemble(advisor_pack, roadmap, polish):
+        out = _verdict_output(payload, plan, advisor_pack or {}, roadmap)
+        emit({"event": "graph", **{k: out[k] for k in ("roadmap_vertices", "roadmap_graph")}})
+        if polish:
+            out["rationales"] = polish
+        return out
+
+    async def output(**inputs):
+        return assemble(**inputs)
+
+    values, degraded = await run_stages([
+        Stage("advisor_pack", advisor_pack, deadline=limits["advisor_pack"],
+              fallback=lambda: emit_advisor_pack(_advisor_pack_fallback(_advisor_pack_inputs(seed)))),
+        Stage("polish", polish, deadline=limits["polish"]),
+        Stage("roadmap", roadmap, inputs=("advisor_pack",), fallback=partial_roadmap,
+              fallback_deadline=limits["fallback"]),
+        Stage("output", output, inputs=("advisor_pack", "roadmap", "polish"), fallback=assemble),
+    ], deadline=limits["total"])
+
+    out = values["output"]
+    if degraded:
+        out["partial"] = degraded
+    return out
+
+def _verdict_plan(payload: dict) -> dict:
+    """Heuristic part of the verdict: interests, levels, top picks and the advisor seed."""
+    interests, levels, goal, hours = _verdict_inputs(payload)
+    catalog = _compiled_catalog()
+    picks = catalog.top_picks(catalog.encode_users([interests], [levels], [goal], [hours]), k=5)[0]
 
     # Use original seed interests for topic-specific generation
     seed_interests_raw = payload.get("seed_interests", "")
@@ -265,50 +433,47 @@ def make_verdict(payload: dict) -> dict:
         }
     }
     
-    advisor_pack = generate_advisor_pack(advisor_seed)
-    
-    # Generate course roadmap using the same client
-    client = _anthropic_client() if USE_LLM else None
-    vertices, edges = generate_course_roadmap(
-        advisor_pack.get("advisor_description", ""),
-        advisor_pack.get("conversation_transcript", ""),
-        advisor_pack.get("skill_levels", []),
-        client=client
-    )
+    return {
+        "interests": interests, "levels": levels, "goal": goal, "hours": hours,
+        "picks": picks, "advisor_seed": advisor_seed,
+    }
 
-    out = {
-        "summary": {
-            "primary_topics": interests[:3],
-            "estimated_levels": levels,
-            "study_time": hours,
-            "goal": goal
-        },
-        "recommendations": picks,
+def _verdict_summary(plan: dict) -> dict:
+    return {
+        "primary_topics": plan["interests"][:3],
+        "estimated_levels": plan["levels"],
+        "study_time": plan["hours"],
+        "goal": plan["goal"]
+    }
+
+def _verdict_output(payload: dict, plan: dict, advisor_pack: dict, graph: dict = None) -> dict:
+    from course_graph import empty_graph
+    graph = graph or empty_graph()
+    return {
+        "summary": _verdict_summary(plan),
+        "recommendations": plan["picks"],
         "questions": payload.get("questions", []),
         "answers": payload.get("answers", {}),
         "advisor_description": advisor_pack.get("advisor_description", ""),
         "conversation_transcript": advisor_pack.get("conversation_transcript", ""),
         "skill_levels": advisor_pack.get("skill_levels", []),
-        "roadmap_vertices": vertices,
-        "roadmap_edges": edges
+        # [[name, description]]; the index is the course's id in roadmap_graph
+        "roadmap_vertices": graph["nodes"],
+        # prerequisite -> dependent edges as [src, dst] ids, topological order and
+        # depth per course; clients derive name pairs from roadmap_vertices
+        "roadmap_graph": {"edges": graph["edges"], "order": graph["order"], "depth": graph["depth"]}
     }
 
-    # Optional short polish (kept tiny for latency)
-    if USE_LLM:
-        try:
-            client = _anthropic_client()
-            content = json.dumps(out, ensure_ascii=False)
-            resp = client.messages.create(
-                model=MODEL_VERDICT,
-                max_tokens=220,
-                system="You are a concise academic advisor. Return JSON with a 'rationales' object mapping course.id -> short rationale (1 sentence).",
-                messages=[{"role":"user","content": f"Add rationales to this JSON and return JSON only:\n{content}"}]
-            )
-            refined = json.loads(resp.content[0].text.strip())
-            return refined
-        except Exception:
-            return out
-    return out
+def _polish_request(plan: dict) -> dict:
+    """messages.create kwargs for the optional rationale polish (summary and picks only)."""
+    content = json.dumps({"summary": _verdict_summary(plan), "recommendations": plan["picks"]},
+                         ensure_ascii=False)
+    return dict(
+        model=_model_verdict(),
+        max_tokens=220,
+        system="You are a concise academic advisor. Return JSON with a 'rationales' object mapping course.id -> short rationale (1 sentence).",
+        messages=[{"role":"user","content": f"Write rationales for these recommendations and return JSON only:\n{content}"}]
+    )
 
 # ==== BEGIN: free-text relevance ranking (mode="rank") ====
 
@@ -388,14 +553,39 @@ TOPIC_SYNONYMS = {
 
 ALL_TOPICS = list(TOPIC_SYNONYMS.keys())
 
+# Vocabulary compiled once (phrase_matcher.py). Both lists (35 terms, 93
+# synonyms) are below its automaton threshold, so a text is searched with one
+# C substring search per phrase, the fastest option at this size.
+_RANK_MATCHERS = None
+
+def _rank_matchers():
+    global _RANK_MATCHERS
+    if _RANK_MATCHERS is None:
+        from phrase_matcher import PhraseMatcher
+        syn_topics = {}
+        for topic, syns in TOPIC_SYNONYMS.items():
+            for s in syns:
+                syn_topics.setdefault(s, []).append(topic)
+        _RANK_MATCHERS = {
+            "terms": PhraseMatcher(TERMS2TOPICS),
+            "synonyms": PhraseMatcher(syn_topics),
+            "syn_topics": syn_topics,
+        }
+    return _RANK_MATCHERS
+
+def _topic_text_scores(text: str) -> dict:
+    """_text_score_for_topic for every topic at once: {topic: boost} for topics with hits."""
+    if not text: return {}
+    m = _rank_matchers()
+    hits = {}
+    for kw in m["synonyms"].phrases_in(text.lower()):
+        for topic in m["syn_topics"][kw]:
+            hits[topic] = hits.get(topic, 0) + 1
+    return {t: min(0.3, 0.1 * n) for t, n in hits.items()}  # cap small
+
 def _text_score_for_topic(text: str, topic: str) -> float:
     """Tiny keyword hit counter as a soft boost from free text."""
-    if not text: return 0.0
-    t = text.lower()
-    hits = 0
-    for kw in TOPIC_SYNONYMS.get(topic, []):
-        if kw in t: hits += 1
-    return min(0.3, 0.1 * hits)  # cap small
+    return _topic_text_scores(text).get(topic, 0.0)
 
 def _seed_weights_from_term(term: str) -> dict:
     term_l = (term or "").lower().strip()
@@ -406,17 +596,16 @@ def _seed_weights_from_term(term: str) -> dict:
     if term_l in weights:
         weights[term_l] = max(weights[term_l], 1.0)
 
-    # Dictionary hits
-    for key, pairs in TERMS2TOPICS.items():
-        if key in term_l or term_l in key:
-            for topic, w in pairs:
-                weights[topic] = max(weights[topic], w)
+    # Dictionary hits (key inside the term, or the term inside a key)
+    m = _rank_matchers()
+    for key in m["terms"].phrases_in(term_l) | m["terms"].phrases_containing(term_l):
+        for topic, w in TERMS2TOPICS[key]:
+            weights[topic] = max(weights[topic], w)
 
     # Synonym hits
-    for topic, syns in TOPIC_SYNONYMS.items():
-        for s in syns:
-            if s in term_l or term_l in s:
-                weights[topic] = max(weights[topic], 0.6)
+    for s in m["synonyms"].phrases_in(term_l) | m["synonyms"].phrases_containing(term_l):
+        for topic in m["syn_topics"][s]:
+            weights[topic] = max(weights[topic], 0.6)
     return weights
 
 def _normalize_scores(d: dict) -> dict:
@@ -424,16 +613,15 @@ def _normalize_scores(d: dict) -> dict:
     if m <= 0: return d
     return {k: v / m for k, v in d.items()}
 
-def _rank_to_courses(topic_scores: dict, top_k=5):
-    # Use your existing CATALOG (from verdict section)
-    ranked = []
-    for c in CATALOG:
-        s = 0.0
-        for tag in c["tags"]:
-            s += topic_scores.get(tag, 0.0)
-        ranked.append((s, c))
-    ranked.sort(key=lambda x: x[0], reverse=True)
-    return [c for s, c in ranked[:top_k] if s > 0]
+def _rank_to_courses(topic_scores: dict, top_k=5, query=""):
+    # Real OCW courses from the precomputed sparse index (built by python catalog_index.py build)
+    import rank_index
+    courses = rank_index.top_courses(topic_scores, query, top_k, TOPIC_SYNONYMS, TERMS2TOPICS)
+    if courses is not None:
+        return courses
+
+    # No index yet: fall back to the hand-written CATALOG (from verdict section)
+    return _compiled_catalog().rank_topics(topic_scores, k=top_k)
 
 def rank_query(payload: dict) -> dict:
     """
@@ -457,7 +645,8 @@ def rank_query(payload: dict) -> dict:
     combined_text = f"{desc}\n{convo}".strip()
 
     # 1) seed scores from the term itself
-    scores = _seed_weights_from_term(q)
+    seed = _seed_weights_from_term(q)
+    scores = dict(seed)
 
     # 2) boost by user’s stated interests/top3
     for topic in ALL_TOPICS:
@@ -465,8 +654,9 @@ def rank_query(payload: dict) -> dict:
         if topic in top3:      scores[topic] += 0.20
 
     # 3) light boost from advisor description / transcript text
-    for topic in ALL_TOPICS:
-        scores[topic] += _text_score_for_topic(combined_text, topic)
+    context = _topic_text_scores(combined_text)
+    for topic, boost in context.items():
+        scores[topic] += boost
 
     # 4) tiny nudge for gaps (Beginner levels) = “relevance to growth”
     gaps = set()
@@ -486,15 +676,15 @@ def rank_query(payload: dict) -> dict:
     ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
 
     # 6) pick courses by these topic weights
-    top_courses = _rank_to_courses(scores, top_k=5)
+    top_courses = _rank_to_courses(scores, top_k=5, query=q)
 
     # reasons: show top 6 with non-zero scores
     explanations = [
         {"topic": t, "score": round(s, 3),
          "reason": (
             ("interest/top3 boost; " if (t in interests or t in top3) else "") +
-            ("context match; " if _text_score_for_topic(combined_text, t) > 0 else "") +
-            ("term mapping; " if _seed_weights_from_term(q).get(t,0)>0 else "")
+            ("context match; " if context.get(t, 0) > 0 else "") +
+            ("term mapping; " if seed.get(t, 0) > 0 else "")
          ).strip().rstrip(";")
         }
         for t, s in ranked[:6] if s > 0
@@ -527,6 +717,37 @@ def generate_advisor_pack(seed: dict) -> dict:
       transcript_turns    (int)  default 3 (Advisor asks / Student answers)
       levels              (dict) map like {"Mathematics":"Beginner","Programming":"Intermediate", ...}
     """
+    inp = _advisor_pack_inputs(seed)
+
+    if _use_llm():
+        try:
+            client = _anthropic_client()
+            # Reuse strict JSON helper
+            obj = _llm_json(client, _model_verdict(), inp["prompt"], max_tokens=600)
+            return _advisor_pack_from_llm(obj, inp["levels"])
+        except Exception:
+            # Fall through to template
+            pass
+
+    return _advisor_pack_fallback(inp)
+
+async def agenerate_advisor_pack(seed: dict, timeout: float = None) -> dict:
+    """Async generate_advisor_pack on the shared async client; falls back to the template on error or timeout."""
+    inp = _advisor_pack_inputs(seed)
+
+    if _use_llm():
+        try:
+            client = _async_anthropic_client()
+            obj = await asyncio.wait_for(
+                _allm_json(client, _model_verdict(), inp["prompt"], max_tokens=600), timeout)
+            return _advisor_pack_from_llm(obj, inp["levels"])
+        except Exception:
+            pass
+
+    return _advisor_pack_fallback(inp)
+
+def _advisor_pack_inputs(seed: dict) -> dict:
+    """Normalize an advisor seed (see generate_advisor_pack) and build the LLM prompt for it."""
     language = (seed.get("language") or "English").strip()
     topic = (seed.get("topic") or "artificial intelligence and machine learning").strip()
 
@@ -553,12 +774,8 @@ def generate_advisor_pack(seed: dict) -> dict:
         if k in levels and v in {"Beginner","Intermediate","Advanced"}:
             levels[k] = v
 
-    if USE_LLM:
-        try:
-            client = _anthropic_client()
-            
-            # Create highly specific prompt based on the topic
-            topic_specific_prompt = f"""
+    # Create highly specific prompt based on the topic
+    topic_specific_prompt = f"""
 You are creating a personalized academic advisor profile for a student interested in {topic}.
 
 Generate STRICT JSON with exactly these keys: advisor_description, conversation_transcript, skill_levels
@@ -592,39 +809,45 @@ Student goal: {goal}
 Student gaps: {gaps}
 Language: {language}
 """
-            
-            # Reuse strict JSON helper
-            obj = _llm_json(client, MODEL_VERDICT, topic_specific_prompt, max_tokens=600)
-
-            # Light post-validate / coerce
-            adv = (obj.get("advisor_description") or "").strip()
-            convo = (obj.get("conversation_transcript") or "").strip()
-            skl = obj.get("skill_levels") or []
-            # Ensure skill levels structure
-            def _coerce_levels(x):
-                ok_levels = {"Beginner","Intermediate","Advanced"}
-                names = ["Mathematics","Programming","Statistics","Machine Learning"]
-                out = []
-                have = {k for k, _ in x if isinstance(k, str)}
-                for name in names:
-                    val = None
-                    for k, v in x:
-                        if k == name and isinstance(v, str) and v in ok_levels:
-                            val = v; break
-                    if not val:
-                        val = levels[name]
-                    out.append([name, val])
-                return out
-            skl = _coerce_levels(skl if isinstance(skl, list) else [])
-
-            return {
-                "advisor_description": adv,
-                "conversation_transcript": convo,
-                "skill_levels": skl
-            }
-        except Exception:
-            # Fall through to template
-            pass
+
+    return {
+        "language": language, "topic": topic, "interests": interests, "role": role,
+        "goal": goal, "gaps": gaps, "transcript_turns": transcript_turns,
+        "levels": levels, "prompt": topic_specific_prompt,
+    }
+
+def _advisor_pack_from_llm(obj: dict, levels: dict) -> dict:
+    # Light post-validate / coerce
+    adv = (obj.get("advisor_description") or "").strip()
+    convo = (obj.get("conversation_transcript") or "").strip()
+    skl = obj.get("skill_levels") or []
+    # Ensure skill levels structure
+    def _coerce_levels(x):
+        ok_levels = {"Beginner","Intermediate","Advanced"}
+        names = ["Mathematics","Programming","Statistics","Machine Learning"]
+        out = []
+        have = {k for k, _ in x if isinstance(k, str)}
+        for name in names:
+            val = None
+            for k, v in x:
+                if k == name and isinstance(v, str) and v in ok_levels:
+                    val = v; break
+            if not val:
+                val = levels[name]
+            out.append([name, val])
+        return out
+    skl = _coerce_levels(skl if isinstance(skl, list) else [])
+
+    return {
+        "advisor_description": adv,
+        "conversation_transcript": convo,
+        "skill_levels": skl
+    }
+
+def _advisor_pack_fallback(inp: dict) -> dict:
+    topic, interests, role = inp["topic"], inp["interests"], inp["role"]
+    goal, gaps, levels = inp["goal"], inp["gaps"], inp["levels"]
+    transcript_turns = inp["transcript_turns"]
 
     # -------- Fallback (no LLM) --------
     # Build a topic-specific template
@@ -721,46 +944,109 @@ Language: {language}
 
     skill_levels = [[k, v] for k, v in topic_levels.items()]
     
-    graph = generate_course_roadmap(advisor_description, conversation_transcript, skill_levels)
-
     return {
         "advisor_description": advisor_description,
         "conversation_transcript": conversation_transcript,
         "skill_levels": skill_levels
     }
 
-# ---------- main (append a new mode) ----------
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "No input"})); sys.exit(1)
+# ---------- startup budget (--startup-report) ----------
+# Deferred dependencies each mode pulls in before it can answer
+MODE_DEPS = {
+    "rank":         [],
+    "questions":    ["env", "anthropic"],
+    "verdict":      ["env", "anthropic", "course_recommender", "verdict_scoring", "stage_scheduler",
+                     "local_roadmap"],
+    "advisor_pack": ["env", "anthropic", "course_recommender"],
+    "people_graph": ["env", "read_db", "psycopg_pool"],
+}
+# Cold-start budget per mode: interpreter + import script + the mode's deps
+STARTUP_BUDGET_MS = {
+    "rank":         150,
+    "questions":    700,
+    "verdict":      900,
+    "advisor_pack": 900,
+    "people_graph": 900,
+}
 
-    raw = sys.argv[1]
-    if raw.strip().lower() == "questions":
-        try:
-            out = generate_questions({"interests_hint":[]})
-            print(json.dumps({"input":"questions","output":out}, ensure_ascii=False))
-        except Exception as e:
-            print(json.dumps({"error": str(e)}))
-        sys.exit(0)
+def _warm_mode(mode: str):
+    """Import/load everything `mode` needs, without doing any real work."""
+    import importlib
+    for dep in MODE_DEPS.get(mode, []):
+        if dep == "env":
+            load_env()
+        else:
+            importlib.import_module(dep)
 
-    try:
-        payload = json.loads(raw)
-    except Exception as e:
-        print(json.dumps({"error": f"Invalid JSON: {e}"})); sys.exit(1)
+def startup_report() -> dict:
+    """
+    Measure a cold start per mode in a fresh interpreter and compare it with
+    STARTUP_BUDGET_MS. Returns {mode: {"ms", "budget_ms", "within_budget"[, "error"]}}.
+    """
+    import subprocess, time
+    here = os.path.dirname(os.path.abspath(__file__))
+    report = {}
+    for mode, budget in STARTUP_BUDGET_MS.items():
+        code = f"import script; script._warm_mode({mode!r})"
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", code], cwd=here,
+                              capture_output=True, text=True)
+        ms = (time.perf_counter() - t0) * 1000.0
+        entry = {"ms": round(ms, 1), "budget_ms": budget,
+                 "within_budget": proc.returncode == 0 and ms <= budget}
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            entry["error"] = lines[-1] if lines else f"exit code {proc.returncode}"
+        report[mode] = entry
+    return report
+
+# ---------- worker counters (mode="stats") ----------
+def worker_stats() -> dict:
+    """Cache and LLM usage counters of this process; most useful against a long-lived --serve worker."""
+    import catalog_index
+    from interest_index import INTEREST_INDEX
+    from llm_cache import LLM_CACHE
+    from llm_usage import LLM_USAGE
+    from single_flight import FLIGHTS
+    return {
+        "department_cache": catalog_index.DEPARTMENT_CACHE.stats(),
+        "interest_index": INTEREST_INDEX.stats(),
+        "llm_cache": LLM_CACHE.stats(),
+        "llm_usage": LLM_USAGE.stats(),
+        "single_flight": FLIGHTS.stats(),
+    }
 
+# ---------- request dispatch (shared by CLI and --serve) ----------
+def handle_request(payload: dict) -> dict:
+    """
+    Run one mode and return the response object the CLI prints, e.g.
+    {"input": "questions", "output": {...}} or {"error": "..."}.
+    """
     mode = payload.get("mode")
     if mode == "questions":
         try:
             out = generate_questions(payload.get("seed", {}))
-            print(json.dumps({"input":"questions","output":out}, ensure_ascii=False))
+            return {"input":"questions","output":out}
         except Exception as e:
-            print(json.dumps({"error": str(e)}))
+            return {"error": str(e)}
     elif mode == "verdict":
         try:
-            out = make_verdict(payload.get("answers", {}))
-            print(json.dumps({"input":"verdict","output":out}, ensure_ascii=False))
+            out = make_verdict(payload.get("answers", {}), roadmap_engine=payload.get("roadmap_engine"))
+            return {"input":"verdict","output":out}
         except Exception as e:
-            print(json.dumps({"error": str(e)}))
+            return {"error": str(e)}
+    elif mode == "rank":
+        try:
+            out = rank_query(payload)
+            return {"input":"rank","output":out}
+        except Exception as e:
+            return {"error": str(e)}
+    elif mode == "score_batch":
+        try:
+            picks = score_submissions(payload.get("submissions", []), int(payload.get("top_k", 5)))
+            return {"input":"score_batch","output":{"picks":picks}}
+        except Exception as e:
+            return {"error": str(e)}
     elif mode in ("blurb","topic_paragraph"):
         try:
             topic = payload.get("topic") or payload.get("subject") or ""
@@ -768,30 +1054,150 @@ if __name__ == "__main__":
             max_words = payload.get("max_words", 90)
             paragraph = generate_topic_paragraph(topic, language, max_words)
             out = {"topic": topic, "language": language, "paragraph": paragraph}
-            print(json.dumps({"input":"blurb","output":out}, ensure_ascii=False))
+            return {"input":"blurb","output":out}
         except Exception as e:
-            print(json.dumps({"error": str(e)}))
+            return {"error": str(e)}
     elif mode in ("advisor_pack","advisor_profile"):
         try:
             out = generate_advisor_pack(payload.get("seed", {}))
-            # Print in the EXACT variable-style format if requested
-            if payload.get("format") == "variables":
-                print(
-                    "advisor_description = " + json.dumps(out["advisor_description"], ensure_ascii=False) + "\n" +
-                    "conversation_transcript = " + json.dumps(out["conversation_transcript"], ensure_ascii=False) + "\n" +
-                    "skill_levels = " + json.dumps(out["skill_levels"], ensure_ascii=False)
-                )
-            else:
-                print(json.dumps({"input":"advisor_pack","output":out}, ensure_ascii=False))
+            return {"input":"advisor_pack","output":out}
         except Exception as e:
-            print(json.dumps({"error": str(e)}))
+            return {"error": str(e)}
     elif mode == "people_graph":
         try:
-            from read_db import get_people_graph_data
+            from read_db import get_people_graph_data, get_people_neighborhood
             current_user_id = payload.get("current_user_id", "")
-            out = get_people_graph_data(current_user_id)
-            print(json.dumps({"input":"people_graph","output":out}, ensure_ascii=False))
+            if payload.get("scope") == "neighborhood":
+                out = get_people_neighborhood(
+                    current_user_id, hops=payload.get("hops"), k=payload.get("k"), limit=payload.get("limit"),
+                    cursor=payload.get("cursor"), projection=payload.get("projection") or "light")
+            else:
+                out = get_people_graph_data(current_user_id)
+            return {"input":"people_graph","output":out}
+        except Exception as e:
+            return {"error": str(e)}
+    elif mode == "stats":
+        return {"input":"stats","output":worker_stats()}
+    return {"error":"Unknown mode; use 'questions', 'verdict', 'rank', 'score_batch', 'blurb', 'advisor_pack', 'people_graph', or 'stats'."}
+
+# ---------- long-lived worker (--serve) ----------
+async def ahandle_request(payload: dict, emit=None) -> dict:
+    """
+    handle_request for the --serve event loop: verdicts run natively async, other
+    modes in a thread. With "stream": true, a verdict also sends its partial
+    results to `emit` as they are ready (see amake_verdict).
+    """
+    if payload.get("mode") == "verdict":
+        try:
+            out = await amake_verdict(payload.get("answers", {}), deadlines=payload.get("deadlines"),
+                                      emit=emit if payload.get("stream") else None,
+                                      roadmap_engine=payload.get("roadmap_engine"))
+            return {"input":"verdict","output":out}
+        except Exception as e:
+            return {"error": str(e)}
+    return await asyncio.to_thread(handle_request, payload)
+
+def serve(stdin=None, stdout=None):
+    """
+    Keep one warm process and answer newline-delimited JSON requests.
+
+    Each input line is a request payload (same shape as the CLI argument) plus
+    an optional "id"; each output line is {"id": <same id>, "result": {...}}
+    where result is exactly what handle_request returns. A streaming verdict
+    ("stream": true) first sends {"id": ..., "event": {...}} lines, then its
+    result line. Requests run
+    concurrently on one event loop, so responses may come back out of order.
+    Anything the handlers print is redirected to stderr so stdout carries only
+    protocol lines.
+    """
+    asyncio.run(_serve(stdin or sys.stdin, stdout or sys.stdout))
+
+async def _serve(stdin, stdout):
+    loop = asyncio.get_running_loop()
+    tasks = set()
+
+    def write(msg):
+        stdout.write(json.dumps(msg, ensure_ascii=False) + "\n")
+        stdout.flush()
+
+    def reply(req_id, result):
+        write({"id": req_id, "result": result})
+
+    async def run(req_id, payload):
+        try:
+            result = await ahandle_request(payload, emit=lambda event: write({"id": req_id, "event": event}))
+        except Exception as e:
+            result = {"error": str(e)}
+        reply(req_id, result)
+
+    saved_stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        while True:
+            line = await loop.run_in_executor(None, stdin.readline)
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                payload = json.loads(line)
+                if not isinstance(payload, dict):
+                    raise ValueError("request must be a JSON object")
+            except Exception as e:
+                reply(None, {"error": f"Invalid JSON: {e}"})
+                continue
+            task = asyncio.create_task(run(payload.pop("id", None), payload))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        sys.stdout = saved_stdout
+
+# ---------- main (append a new mode) ----------
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(json.dumps({"error": "No input"})); sys.exit(1)
+
+    raw = sys.argv[1]
+    if raw.strip() == "--serve":
+        serve()
+        sys.exit(0)
+
+    if raw.strip() == "--startup-report":
+        print(json.dumps(startup_report(), indent=2))
+        sys.exit(0)
+
+    if raw.strip().lower() == "questions":
+        try:
+            out = generate_questions({"interests_hint":[]})
+            print(json.dumps({"input":"questions","output":out}, ensure_ascii=False))
         except Exception as e:
             print(json.dumps({"error": str(e)}))
-    else:
-        print(json.dumps({"error":"Unknown mode; use 'questions', 'verdict', 'blurb', 'advisor_pack', or 'people_graph'."}))
+        sys.exit(0)
+
+    try:
+        payload = json.loads(raw)
+    except Exception as e:
+        print(json.dumps({"error": f"Invalid JSON: {e}"})); sys.exit(1)
+
+    # Print in the EXACT variable-style format if requested
+    if payload.get("mode") in ("advisor_pack","advisor_profile") and payload.get("format") == "variables":
+        try:
+            out = generate_advisor_pack(payload.get("seed", {}))
+            print(
+                "advisor_description = " + json.dumps(out["advisor_description"], ensure_ascii=False) + "\n" +
+                "conversation_transcript = " + json.dumps(out["conversation_transcript"], ensure_ascii=False) + "\n" +
+                "skill_levels = " + json.dumps(out["skill_levels"], ensure_ascii=False)
+            )
+        except Exception as e:
+            print(json.dumps({"error": str(e)}))
+        sys.exit(0)
+
+    # Streaming verdict from the CLI: one JSON event per line, then the result line
+    if payload.get("mode") == "verdict" and payload.get("stream"):
+        emit = lambda event: print(json.dumps(event, ensure_ascii=False), flush=True)
+        print(json.dumps(asyncio.run(ahandle_request(payload, emit=emit)), ensure_ascii=False))
+        sys.exit(0)
+
+    print(json.dumps(handle_request(payload), ensure_ascii=False))
@@ -0,0 +1,107 @@
+# stage_scheduler.py — run a small DAG of async stages with per-stage and global deadlines
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    One step of a pipeline.
+
+    run(**inputs) is awaited once every stage named in `inputs` has a value;
+    `deadline` (seconds) bounds that await. When the stage fails, runs late or
+    is cut off by the global deadline, fallback(**inputs) supplies its value
+    instead, so later stages still get something to work with. A fallback
+    runs on the event loop: one that does real work should be async (e.g.
+    asyncio.to_thread) and is then bounded by `fallback_deadline`, after
+    which the stage's value is None.
+    """
+
+    __slots__ = ("name", "run", "inputs", "deadline", "fallback", "fallback_deadline")
+
+    def __init__(self, name: str, run: Callable[..., Awaitable[Any]], inputs: Sequence[str] = (),
+                 deadline: Optional[float] = None, fallback: Callable[..., Any] = lambda **_: None,
+                 fallback_deadline: Optional[float] = None):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.deadline = deadline
+        self.fallback = fallback
+        self.fallback_deadline = fallback_deadline
+
+
+async def run_stages(stages: Sequence[Stage], deadline: Optional[float] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Run `stages` (listed in dependency order) with every stage starting as soon
+    as its inputs are ready, so independent stages overlap. After `deadline`
+    seconds whatever is still running is cancelled and falls back.
+
+    Returns ({stage name: value}, [names of stages that used their fallback]).
+    """
+    names = set()
+    for stage in stages:
+        missing = [n for n in stage.inputs if n not in names]
+        if missing:
+            raise ValueError(f"stage {stage.name!r} depends on {missing}, which are not declared before it")
+        names.add(stage.name)
+
+    loop = asyncio.get_running_loop()
+    values: Dict[str, asyncio.Future] = {s.name: loop.create_future() for s in stages}
+    degraded: List[str] = []
+
+    async def fallback(stage, args):
+        try:
+            value = stage.fallback(**args)
+            if inspect.isawaitable(value):
+                value = await asyncio.wait_for(value, stage.fallback_deadline)
+            return value
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            kind = "exceeded its deadline" if isinstance(e, asyncio.TimeoutError) else f"failed: {e}"
+            logger.error(f"Fallback for stage {stage.name} {kind}")
+            return None
+
+    def settle(stage, value, fell_back):
+        if not values[stage.name].done():
+            values[stage.name].set_result(value)
+            if fell_back:
+                degraded.append(stage.name)
+
+    async def drive(stage):
+        # shielded: cancelling a waiting stage must not cancel its inputs' futures
+        args = {n: await asyncio.shield(values[n]) for n in stage.inputs}
+        started = time.perf_counter()
+        try:
+            value = await asyncio.wait_for(stage.run(**args), stage.deadline)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            kind = "exceeded its deadline" if isinstance(e, asyncio.TimeoutError) else f"failed: {e}"
+            logger.warning(f"Stage {stage.name} {kind} after {time.perf_counter() - started:.2f}s; using fallback")
+            settle(stage, await fallback(stage, args), True)
+            return
+        settle(stage, value, False)
+
+    tasks = [asyncio.ensure_future(drive(s)) for s in stages]
+    try:
+        _, pending = await asyncio.wait(tasks, timeout=deadline)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+    if pending:
+        logger.warning(f"Global deadline of {deadline}s reached with {len(pending)} stage(s) unfinished")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    # In dependency order, so each fallback sees its inputs' final values
+    for stage in stages:
+        if not values[stage.name].done():
+            settle(stage, await fallback(stage, {n: values[n].result() for n in stage.inputs}), True)
+
+    return {name: fut.result() for name, fut in values.items()}, degraded
@@ -0,0 +1,122 @@
+# verdict_scoring.py — vectorised catalog scoring for many questionnaire submissions at once
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+LEVEL_KEYS = ("math", "programming", "study")
+
+# Which estimated levels a course's difficulty is compared against: the first
+# rule whose tags overlap the course wins (weights over LEVEL_KEYS).
+LEVEL_RULES = [
+    (("ml", "ai", "nlp"),         (0.5, 0.5, 0.0)),
+    (("math",),                   (1.0, 0.0, 0.0)),
+    (("cs", "web"),               (0.0, 1.0, 0.0)),
+    (("data", "stats"),           (0.5, 0.0, 0.5)),
+    (("astronomy", "physics"),    (0.7, 0.0, 0.3)),
+    (("biology",),                (0.0, 0.5, 0.5)),
+    (("art", "history"),          (0.0, 0.0, 1.0)),
+]
+DEFAULT_LEVEL_MIX = (0.0, 0.5, 0.5)
+
+# (goals, course ids, bonus)
+GOAL_BONUSES = [
+    (("build projects", "career switch"), ("ml_projects", "web_fullstack", "data_analytics"), 1.0),
+    (("get foundations", "pass a class"),
+     ("math_found", "python_intro", "lin_alg", "ds_algo", "astronomy_intro", "physics_intro"), 1.0),
+    (("research prep",), ("nlp_intro", "lin_alg", "econ_data", "astrophysics", "stellar_evolution"), 0.7),
+]
+
+HOURS_SCORE = {"<2h": 0, "2–4h": 1, "5–7h": 2, "8–12h": 3, "13+h": 4}
+
+NO_MATCH = -1e9
+
+
+class CompiledCatalog:
+    """
+    A CATALOG-shaped course list ({"id", "tags", "level"}) encoded once as
+    arrays: a course x tag incidence matrix, course levels, the level mix each
+    course is judged against and a goal x course bonus table. `score` then
+    rates any number of users against every course with a few matrix ops.
+    """
+
+    def __init__(self, catalog: Sequence[Dict]):
+        self.courses = list(catalog)
+        self.topics = sorted({t for c in self.courses for t in c["tags"]})
+        self.topic_index = {t: i for i, t in enumerate(self.topics)}
+
+        n = len(self.courses)
+        self.tags = np.zeros((n, len(self.topics)))
+        self.level = np.zeros(n)
+        self.level_mix = np.zeros((n, len(LEVEL_KEYS)))
+        for i, c in enumerate(self.courses):
+            for t in c["tags"]:
+                self.tags[i, self.topic_index[t]] = 1.0
+            self.level[i] = c["level"]
+            self.level_mix[i] = next((mix for keys, mix in LEVEL_RULES if set(keys) & set(c["tags"])),
+                                     DEFAULT_LEVEL_MIX)
+
+        self.goals = {g: gi for gi, (goals, _, _) in enumerate(GOAL_BONUSES) for g in goals}
+        # one extra all-zero row for "no matching goal"
+        self.goal_bonus = np.zeros((len(GOAL_BONUSES) + 1, n))
+        ids = {c["id"]: i for i, c in enumerate(self.courses)}
+        for gi, (_, course_ids, bonus) in enumerate(GOAL_BONUSES):
+            for cid in course_ids:
+                if cid in ids:
+                    self.goal_bonus[gi, ids[cid]] = bonus
+
+        astro = self.topic_index.get("astronomy")
+        self.astronomy = self.tags[:, astro] if astro is not None else np.zeros(n)
+
+    def encode_users(self, interests: List[List[str]], levels: List[Dict], goals: List[str],
+                     hours: List[str]) -> Dict[str, np.ndarray]:
+        """Per-user inputs -> arrays (interest multi-hot, levels, goal row, hours score)."""
+        u = len(interests)
+        interest = np.zeros((u, len(self.topics)))
+        astro_interest = np.zeros(u)
+        for r, tags in enumerate(interests):
+            for t in tags:
+                col = self.topic_index.get(t)
+                if col is not None:
+                    interest[r, col] = 1.0
+            astro_interest[r] = 1.0 if "astronomy" in tags else 0.0
+        return {
+            "interest": interest,
+            "astro_interest": astro_interest,
+            "levels": np.array([[lv[k] for k in LEVEL_KEYS] for lv in levels], dtype=float).reshape(u, len(LEVEL_KEYS)),
+            "goal": np.array([self.goals.get(g, len(GOAL_BONUSES)) for g in goals], dtype=int),
+            "hours": np.array([HOURS_SCORE.get(h, 1) for h in hours], dtype=float),
+        }
+
+    def score(self, users: Dict[str, np.ndarray]) -> np.ndarray:
+        """users x courses scores; NO_MATCH where a course shares no tag with the user's interests."""
+        overlap = users["interest"] @ self.tags.T
+        target = users["levels"] @ self.level_mix.T
+        fit = 1.0 - np.minimum(1.5, np.abs(self.level[None, :] - target)) / 1.5
+        scores = (2.0 * overlap + 1.5 * fit
+                  + self.goal_bonus[users["goal"]]
+                  + 1.5 * np.outer(users["astro_interest"], self.astronomy)
+                  + 0.1 * users["hours"][:, None])
+        return np.where(overlap > 0, scores, NO_MATCH)
+
+    def top_picks(self, users: Dict[str, np.ndarray], k: int = 5) -> List[List[Dict]]:
+        """Best k matching courses per user, best first (ties keep catalog order)."""
+        scores = self.score(users)
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(scores.shape[0])]
+        # k-th best per row without a full sort; everything tied with it stays a
+        # candidate so the stable sort below still breaks ties by catalog order
+        kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+        out = []
+        for row, cutoff in zip(scores, kth):
+            cand = np.flatnonzero(row >= cutoff)
+            best = cand[np.argsort(-row[cand], kind="stable")[:k]]
+            out.append([self.courses[j] for j in best if row[j] > NO_MATCH / 10])
+        return out
+
+    def rank_topics(self, topic_scores: Dict[str, float], k: int = 5) -> List[Dict]:
+        """Courses by summed topic weight of their tags (rank fallback); only positive scores."""
+        vec = np.array([topic_scores.get(t, 0.0) for t in self.topics])
+        scores = self.tags @ vec
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [self.courses[j] for j in order if scores[j] > 0]
@@ -0,0 +1,116 @@
+// py-pool.js - fixed-size pool of script.py workers, split into per-mode lanes
+const { PyWorker } = require("./py-worker");
+
+// Fast modes must never queue behind a multi-second verdict, so each lane owns
+// its own workers and its own bounded queue. perWorker is how many jobs one
+// worker may run at once (script.py --serve handles requests concurrently).
+const DEFAULT_LANES = {
+  fast: {
+    modes: ["rank", "questions"],
+    workers: Number(process.env.PY_POOL_FAST_WORKERS || 2),
+    maxQueue: Number(process.env.PY_POOL_FAST_QUEUE || 32),
+    timeoutMs: Number(process.env.PY_POOL_FAST_TIMEOUT_MS || 30000)
+  },
+  slow: {
+    modes: ["verdict", "advisor_pack", "advisor_profile", "blurb", "topic_paragraph"],
+    workers: Number(process.env.PY_POOL_SLOW_WORKERS || 2),
+    // verdicts are mostly awaiting the LLM, so one asyncio worker runs several at once
+    perWorker: Number(process.env.PY_POOL_SLOW_PER_WORKER || 4),
+    maxQueue: Number(process.env.PY_POOL_SLOW_QUEUE || 8),
+    // above the verdict's own global deadline (VERDICT_DEADLINE_TOTAL), which should fire first
+    timeoutMs: Number(process.env.PY_POOL_SLOW_TIMEOUT_MS || 180000)
+  },
+  db: {
+    modes: ["people_graph"],
+    workers: Number(process.env.PY_POOL_DB_WORKERS || 1),
+    maxQueue: Number(process.env.PY_POOL_DB_QUEUE || 16),
+    timeoutMs: Number(process.env.PY_POOL_DB_TIMEOUT_MS || 60000)
+  }
+};
+
+class Lane {
+  constructor(name, config, pythonPath, scriptPath, options) {
+    this.name = name;
+    this.maxQueue = config.maxQueue;
+    this.timeoutMs = config.timeoutMs || 0; // per request; 0 = no limit
+    this.idle = []; // free slots; a worker appears once per concurrent job it may run
+    this.queue = []; // [{ payload, onEvent, resolve }]
+    this.workers = [];
+    for (let i = 0; i < Math.max(1, config.workers); i++) {
+      this.workers.push(new PyWorker(pythonPath, scriptPath, options));
+    }
+    for (let slot = 0; slot < Math.max(1, config.perWorker || 1); slot++) {
+      this.idle.push(...this.workers);
+    }
+    this.size = this.idle.length;
+  }
+
+  submit(payload, onEvent) {
+    if (this.idle.length === 0 && this.queue.length >= this.maxQueue) {
+      return Promise.resolve({ error: "busy", busy: true, lane: this.name });
+    }
+    return new Promise((resolve) => {
+      this.queue.push({ payload, onEvent, resolve });
+      this._drain();
+    });
+  }
+
+  _drain() {
+    while (this.idle.length && this.queue.length) {
+      const worker = this.idle.pop();
+      const { payload, onEvent, resolve } = this.queue.shift();
+      worker.request(payload, onEvent, this.timeoutMs).then((result) => {
+        this.idle.push(worker);
+        resolve(result);
+        this._drain();
+      });
+    }
+  }
+
+  stats() {
+    return {
+      workers: this.workers.length,
+      slots: this.size,
+      busy: this.size - this.idle.length,
+      queued: this.queue.length,
+      maxQueue: this.maxQueue,
+      timeoutMs: this.timeoutMs,
+      restarts: this.workers.reduce((n, w) => n + w.restarts, 0)
+    };
+  }
+
+  stop() {
+    for (const w of this.workers) w.stop();
+  }
+}
+
+class PyPool {
+  constructor(pythonPath, scriptPath, options = {}) {
+    const lanes = options.lanes || DEFAULT_LANES;
+    this.lanes = {};
+    this.laneByMode = {};
+    for (const [name, config] of Object.entries(lanes)) {
+      this.lanes[name] = new Lane(name, config, pythonPath, scriptPath, options);
+      for (const mode of config.modes) this.laneByMode[mode] = this.lanes[name];
+    }
+    this.defaultLane = this.lanes[options.defaultLane || "slow"];
+  }
+
+  // Resolves with the worker result, or { error: "busy", busy: true } when the lane is saturated
+  request(payload, onEvent) {
+    const lane = this.laneByMode[payload.mode] || this.defaultLane;
+    return lane.submit(payload, onEvent);
+  }
+
+  stats() {
+    const out = {};
+    for (const [name, lane] of Object.entries(this.lanes)) out[name] = lane.stats();
+    return out;
+  }
+
+  stop() {
+    for (const lane of Object.values(this.lanes)) lane.stop();
+  }
+}
+
+module.exports = { PyPool, DEFAULT_LANES };
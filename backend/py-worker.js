@@ -0,0 +1,98 @@
+// py-worker.js - one long-lived `script.py --serve` process
+const { spawn } = require("child_process");
+const path = require("path");
+const readline = require("readline");
+
+class PyWorker {
+  constructor(pythonPath, scriptPath, options = {}) {
+    this.pythonPath = pythonPath;
+    this.scriptPath = scriptPath;
+    this.cwd = options.cwd || path.dirname(scriptPath);
+    this.proc = null;
+    this.nextId = 1;
+    this.pending = new Map(); // id -> { resolve, onEvent, proc, timer }
+    this.restarts = 0;
+  }
+
+  start() {
+    if (this.proc) return;
+    const py = spawn(this.pythonPath, [this.scriptPath, "--serve"], { cwd: this.cwd });
+    this.proc = py;
+
+    readline.createInterface({ input: py.stdout }).on("line", (line) => {
+      let msg;
+      try {
+        msg = JSON.parse(line);
+      } catch (e) {
+        console.error("py-worker: unexpected output:", line);
+        return;
+      }
+      const entry = this.pending.get(msg.id);
+      if (!entry) return;
+      // Streaming requests get {id, event} lines before their {id, result}
+      if (msg.event !== undefined) {
+        if (entry.onEvent) entry.onEvent(msg.event);
+        return;
+      }
+      this._settle(msg.id, msg.result);
+    });
+
+    // In serve mode stderr is diagnostics only (logs, warnings), never the reply
+    py.stderr.on("data", (d) => console.error(`py-worker: ${String(d).trimEnd()}`));
+
+    py.on("close", (code) => {
+      if (this.proc === py) this.proc = null;
+      // Only this process's requests: after a restart the map also holds the new one's
+      for (const [id, entry] of this.pending) {
+        if (entry.proc === py) this._settle(id, { error: `Python worker exited (code ${code})` });
+      }
+    });
+    py.on("error", (e) => console.error("py-worker: failed to start:", e.message));
+    py.stdin.on("error", (e) => console.error("py-worker: stdin:", e.message));
+  }
+
+  _settle(id, result) {
+    const entry = this.pending.get(id);
+    if (!entry) return;
+    this.pending.delete(id);
+    clearTimeout(entry.timer);
+    entry.resolve(result);
+  }
+
+  // Resolves with the same object a one-shot `script.py <json>` run would print;
+  // onEvent (optional) receives the partial results of a streaming request.
+  // After timeoutMs (if set) it resolves with { error: "timeout" } and the
+  // process is killed, since a hung worker would otherwise hold its slot forever;
+  // the next request starts a fresh one.
+  request(payload, onEvent, timeoutMs) {
+    this.start();
+    const id = this.nextId++;
+    const proc = this.proc;
+    return new Promise((resolve) => {
+      const entry = { resolve, onEvent, proc, timer: null };
+      if (timeoutMs > 0) {
+        entry.timer = setTimeout(() => {
+          console.error(`py-worker: ${payload.mode} request timed out after ${timeoutMs}ms; restarting worker`);
+          this._settle(id, { error: "timeout", timeout: true });
+          this.restart(proc);
+        }, timeoutMs);
+      }
+      this.pending.set(id, entry);
+      proc.stdin.write(JSON.stringify({ ...payload, id }) + "\n");
+    });
+  }
+
+  // Kill `proc` (if it is still the current process); its other requests fail on "close"
+  restart(proc) {
+    if (!proc || this.proc !== proc) return;
+    this.proc = null;
+    this.restarts++;
+    proc.kill("SIGKILL");
+  }
+
+  stop() {
+    if (this.proc) this.proc.stdin.end();
+  }
+}
+
+module.exports = { PyWorker };
@@ -1,49 +1,45 @@
 // Exam.js
 const express = require("express");
-const { spawn } = require("child_process");
 const path = require("path");
+const { PyPool } = require("../py-pool");
 const router = express.Router();
 
 const pythonPath = "C:\\Users\\256bit.by\\AppData\\Local\\Programs\\Python\\Python39\\python.exe";
 const scriptPath = path.join(__dirname, "../db_python/script.py");
 
-function runPy(argObj) {
-  return new Promise((resolve) => {
-    let out = "", err = "";
-    const py = spawn(pythonPath, [scriptPath, JSON.stringify(argObj)], {
-      cwd: path.join(__dirname, "../db_python")
-    });
-    py.stdout.on("data", (d) => (out += d));
-    py.stderr.on("data", (d) => (err += d));
-    py.on("close", () => resolve({ out, err }));
-  });
+// Warm `script.py --serve` workers, split into lanes so fast modes never wait on verdicts
+const pool = new PyPool(pythonPath, scriptPath, {
+  cwd: path.join(__dirname, "../db_python")
+});
+
+function runPy(argObj, onEvent) {
+  return pool.request(argObj, onEvent);
+}
+
+// Saturated lanes answer immediately with 503 instead of piling up work
+function sendResult(res, result) {
+  if (result && result.busy) return res.status(503).json(result);
+  return res.json(result);
 }
 
 // Generate AI questions fast
 router.post("/questions", async (req, res) => {
   const seed = req.body?.seed || {}; // { interests_hint: [...], language: "English", count_min, count_max }
-  const { out, err } = await runPy({ mode: "questions", seed });
-  if (err) return res.json({ error: `Python error: ${err}` });
-  try {
-    const result = JSON.parse(out);
-    return res.json(result);
-  } catch (e) {
-    return res.json({ error: `Unexpected output: ${out}` });
-  }
+  const result = await runPy({ mode: "questions", seed });
+  return sendResult(res, result);
 });
 
-// Compute verdict
-router.post("/verdict", async (req, res) => {
-  const answers = req.body?.answers || {};
-  const questions = req.body?.questions || [];
-  const userAnswers = req.body?.answers || {};
-  const advisorDescription = req.body?.advisor_description || "";
-  const conversationTranscript = req.body?.conversation_transcript || "";
-  const skillLevels = req.body?.skill_levels || [];
-  const seedInterests = req.body?.seed_interests || "";
-  
-  const { out, err } = await runPy({ 
-    mode: "verdict", 
+function verdictPayload(body) {
+  const answers = body?.answers || {};
+  const questions = body?.questions || [];
+  const userAnswers = body?.answers || {};
+  const advisorDescription = body?.advisor_description || "";
+  const conversationTranscript = body?.conversation_transcript || "";
+  const skillLevels = body?.skill_levels || [];
+  const seedInterests = body?.seed_interests || "";
+
+  return {
+    mode: "verdict",
     answers: {
       ...answers,
       questions: questions,
@@ -52,68 +48,62 @@ router.post("/verdict", async (req, res) => {
       conversation_transcript: conversationTranscript,
       skill_levels: skillLevels,
       seed_interests: seedInterests
+    },
+    // "local" builds the roadmap from the catalog alone (no LLM calls)
+    ...(body?.roadmap_engine ? { roadmap_engine: body.roadmap_engine } : {})
+  };
+}
+
+// Compute verdict
+router.post("/verdict", async (req, res) => {
+  const result = await runPy(verdictPayload(req.body));
+  return sendResult(res, result);
+});
+
+// Same verdict as newline-delimited JSON: heuristic summary/picks right away,
+// then advisor pack, departments, per-department courses, graph and rationales
+// as each is ready, and finally {"event": "result", ...full verdict response}
+router.post("/verdict/stream", async (req, res) => {
+  const write = (event) => {
+    if (!res.headersSent) {
+      res.setHeader("Content-Type", "application/x-ndjson");
+      res.setHeader("Cache-Control", "no-cache");
+      res.flushHeaders();
     }
-  });
-  if (err) return res.json({ error: `Python error: ${err}` });
-  try {
-    const result = JSON.parse(out);
-    return res.json(result);
-  } catch (e) {
-    return res.json({ error: `Unexpected output: ${out}` });
-  }
+    res.write(JSON.stringify(event) + "\n");
+  };
+  const result = await runPy({ ...verdictPayload(req.body), stream: true }, write);
+  if (!res.headersSent && result && result.busy) return sendResult(res, result);
+  write({ event: "result", ...result });
+  return res.end();
 });
 
 // Add after your other routes
 router.post("/rank", async (req, res) => {
   // expects { query: "econometrics", user: { interests: [...], top3: [...], advisor_description: "...", conversation_transcript: "...", skill_levels: [["Mathematics","Beginner"], ...] } }
   const arg = { mode: "rank", ...req.body };
-  let out = "", err = "";
-  const py = spawn(pythonPath, [scriptPath, JSON.stringify(arg)], {
-    cwd: path.join(__dirname, "../db_python")
-  });
-  py.stdout.on("data", (d) => (out += d));
-  py.stderr.on("data", (d) => (err += d));
-  py.on("close", () => {
-    if (err) return res.json({ error: `Python error: ${err}` });
-    try {
-      const result = JSON.parse(out);
-      return res.json(result);
-    } catch (e) {
-      return res.json({ error: `Unexpected output: ${out}` });
-    }
-  });
+  const result = await runPy(arg);
+  return sendResult(res, result);
 });
 
 // People graph endpoint - get users with KNN relationships
+// scope: "neighborhood" returns only the current user's k-hop similarity
+// neighborhood, `limit` vertices per page (pass back `next_cursor` as `cursor`)
 router.post("/people-graph", async (req, res) => {
-  const { currentUserId } = req.body; // Google ID of current user
-  
+  const { currentUserId, scope, hops, k, limit, cursor, projection } = req.body; // Google ID of current user
+
   if (!currentUserId) {
     return res.json({ error: "currentUserId is required" });
   }
-  
-  const arg = { mode: "people_graph", current_user_id: currentUserId };
-  const { out, err } = await runPy(arg);
-  
-  // Check for real errors (not just INFO logs)
-  const isRealError = err && (
-    err.includes('Error:') || 
-    err.includes('Exception:') || 
-    err.includes('Traceback') ||
-    err.includes('ERROR:')
-  ) && !err.includes('INFO:') && !err.includes('DEBUG:');
-  
-  if (isRealError) return res.json({ error: `Python error: ${err}` });
-  
-  try {
-    const result = JSON.parse(out);
-    return res.json(result);
-  } catch (e) {
-    console.error('JSON parsing error:', e.message);
-    console.error('Raw output:', out);
-    return res.json({ error: `JSON parsing error: ${e.message}. Raw output: ${out.substring(0, 500)}...` });
-  }
+
+  const arg = { mode: "people_graph", current_user_id: currentUserId, scope, hops, k, limit, cursor, projection };
+  const result = await runPy(arg);
+  return sendResult(res, result);
 });
 
+// Pool occupancy per lane (workers, busy, queued)
+router.get("/pool-stats", (req, res) => {
+  res.json(pool.stats());
+});
 
 module.exports = router;
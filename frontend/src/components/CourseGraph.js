@@ -1,7 +1,9 @@
 import React, { useEffect, useRef, useState } from 'react';
 import * as d3 from 'd3';
 
-const CourseGraph = ({ vertices, edges }) => {
+// `graph` (optional) is the verdict's roadmap_graph: edges as [src, dst] vertex
+// indices plus a depth per vertex, so nodes can be laid out in prerequisite layers.
+const CourseGraph = ({ vertices, edges, graph }) => {
   const svgRef = useRef();
   const [selectedCourse, setSelectedCourse] = useState(null);
   const [showDescription, setShowDescription] = useState(false);
@@ -25,28 +27,40 @@ const CourseGraph = ({ vertices, edges }) => {
       .attr("transform", `translate(${margin.left}, ${margin.top})`);
 
     // Process data
+    const layered = Boolean(graph && graph.depth && graph.depth.length === vertices.length);
+    const maxDepth = layered ? Math.max(0, ...graph.depth) : 0;
+    const layerY = depth => maxDepth === 0
+      ? innerHeight / 2
+      : 30 + (depth / maxDepth) * (innerHeight - 60);
+
     const nodes = vertices.map((vertex, index) => ({
-      id: vertex[0],
+      id: layered ? index : vertex[0],
       name: vertex[0],
       description: vertex[1],
       index: index,
+      depth: layered ? graph.depth[index] : 0,
       x: Math.random() * innerWidth * 0.6 + innerWidth * 0.2,
-      y: Math.random() * innerHeight * 0.6 + innerHeight * 0.2
+      y: layered
+        ? layerY(graph.depth[index])
+        : Math.random() * innerHeight * 0.6 + innerHeight * 0.2
     }));
 
-    const links = edges.map(edge => ({
+    const links = (layered ? graph.edges : edges).map(edge => ({
       source: edge[0],
       target: edge[1]
     }));
 
-    // Create simulation with tighter forces
+    // Create simulation with tighter forces; with a layered graph each node is
+    // pulled to the row of its prerequisite depth
     const simulation = d3.forceSimulation(nodes)
-      .force("link", d3.forceLink(links).id(d => d.id).distance(80).strength(0.8))
+      .force("link", d3.forceLink(links).id(d => d.id).distance(80).strength(layered ? 0.3 : 0.8))
       .force("charge", d3.forceManyBody().strength(-400))
       .force("center", d3.forceCenter(innerWidth / 2, innerHeight / 2))
       .force("collision", d3.forceCollide().radius(35))
       .force("x", d3.forceX(innerWidth / 2).strength(0.1))
-      .force("y", d3.forceY(innerHeight / 2).strength(0.1));
+      .force("y", layered
+        ? d3.forceY(d => layerY(d.depth)).strength(0.8)
+        : d3.forceY(innerHeight / 2).strength(0.1));
 
     // Add arrow markers
     svg.append("defs").selectAll("marker")
@@ -204,7 +218,7 @@ const CourseGraph = ({ vertices, edges }) => {
     return () => {
       simulation.stop();
     };
-  }, [vertices, edges]);
+  }, [vertices, edges, graph]);
 
   const closeDescription = () => {
     setShowDescription(false);
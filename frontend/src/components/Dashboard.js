@@ -5,8 +5,10 @@ const Dashboard = ({ user }) => {
   const [peopleData, setPeopleData] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  const fetchPeopleGraph = async () => {
+  // Only the user's similarity neighborhood, one page at a time; `cursor` loads the next page
+  const fetchPeopleGraph = async (cursor = null) => {
     if (!user?.id) {
       setError("User ID not available");
       return;
@@ -23,7 +25,11 @@ const Dashboard = ({ user }) => {
         },
         credentials: 'include',
         body: JSON.stringify({
-          currentUserId: user.id // Google ID
+          currentUserId: user.id, // Google ID
+          scope: 'neighborhood',
+          projection: 'full',
+          limit: 50,
+          cursor
         })
       });
 
@@ -34,7 +40,17 @@ const Dashboard = ({ user }) => {
         return;
       }
 
-      setPeopleData(data.output || data);
+      const page = data.output || data;
+      if (page.error) {
+        setError(page.error);
+        return;
+      }
+      setNextCursor(page.next_cursor || null);
+      setPeopleData(prev => cursor && prev ? {
+        ...prev,
+        vertices: [...prev.vertices, ...page.vertices],
+        edges: [...prev.edges, ...page.edges]
+      } : page);
     } catch (err) {
       setError(`Failed to fetch people data: ${err.message}`);
     } finally {
@@ -104,7 +120,7 @@ const Dashboard = ({ user }) => {
               }}>Community Network</h3>
               
               <button
-                onClick={fetchPeopleGraph}
+                onClick={() => fetchPeopleGraph()}
                 disabled={loading}
                 style={{
                   padding: '12px 24px',
@@ -175,6 +191,27 @@ const Dashboard = ({ user }) => {
                   top5Closest={peopleData.top_5_closest}
                   onUserClick={handleUserClick}
                 />
+
+                {nextCursor && (
+                  <div style={{ textAlign: 'center', marginTop: '16px' }}>
+                    <button
+                      onClick={() => fetchPeopleGraph(nextCursor)}
+                      disabled={loading}
+                      style={{
+                        padding: '10px 20px',
+                        background: 'white',
+                        color: '#1d4ed8',
+                        border: '1px solid #3b82f6',
+                        borderRadius: '12px',
+                        fontSize: '0.95rem',
+                        fontWeight: '600',
+                        cursor: loading ? 'not-allowed' : 'pointer'
+                      }}
+                    >
+                      {loading ? 'Loading...' : 'Expand network'}
+                    </button>
+                  </div>
+                )}
               </div>
             )}
 
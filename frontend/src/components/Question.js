@@ -8,6 +8,15 @@ const KNOWN_TOPICS = new Set([
   'biology','robotics','algorithms','systems','web','physics','quantum','stats','education','design'
 ]);
 
+// The verdict sends prerequisite edges as [src, dst] indexes into roadmap_vertices;
+// this maps them back to [prerequisite name, course name] pairs.
+function roadmapEdgePairs(verdict) {
+  const vertices = verdict?.roadmap_vertices;
+  const edges = verdict?.roadmap_graph?.edges;
+  if (!vertices || !edges) return null;
+  return edges.map(([src, dst]) => [vertices[src][0], vertices[dst][0]]);
+}
+
 const Question = () => {
   const [seedInterests, setSeedInterests] = useState('ml,data'); // optional hint
   const [loading, setLoading] = useState(false);
@@ -266,6 +275,8 @@ const Question = () => {
     );
   };
 
+  const roadmapEdges = roadmapEdgePairs(verdict);
+
   return (
     <div style={{ 
       fontFamily: "'Inter', 'Segoe UI', 'Roboto', sans-serif",
@@ -655,16 +666,17 @@ const Question = () => {
           )}
 
           {/* Display Course Roadmap */}
-          {(verdict.roadmap_vertices || verdict.roadmap_edges) && (
+          {(verdict.roadmap_vertices || roadmapEdges) && (
             <div style={{ marginTop: 24, padding: 16, backgroundColor: '#f0f8ff', borderRadius: 8, border: '1px solid #b0e0e6' }}>
               <h3 style={{ marginTop: 0, marginBottom: 16, color: '#1e3a8a' }}>Course Roadmap</h3>
               
               {/* Interactive Graph Visualization */}
-              {verdict.roadmap_vertices && verdict.roadmap_edges && (
+              {verdict.roadmap_vertices && roadmapEdges && (
                 <div style={{ marginBottom: 20 }}>
                   <CourseGraph 
                     vertices={verdict.roadmap_vertices} 
-                    edges={verdict.roadmap_edges} 
+                    edges={roadmapEdges} 
+                    graph={verdict.roadmap_graph}
                   />
                 </div>
               )}
@@ -704,7 +716,7 @@ const Question = () => {
                     </div>
                   )}
 
-                  {verdict.roadmap_edges && (
+                  {roadmapEdges && (
                     <div style={{ marginBottom: 16 }}>
                       <h4 style={{ margin: '0 0 12px 0', color: '#1d4ed8' }}>Edges (Prerequisites):</h4>
                       <div style={{ 
@@ -719,7 +731,7 @@ const Question = () => {
                         overflow: 'auto',
                         maxHeight: '200px'
                       }}>
-                        {JSON.stringify(verdict.roadmap_edges, null, 2)}
+                        {JSON.stringify(roadmapEdges, null, 2)}
                       </div>
                     </div>
                   )}
@@ -734,7 +746,7 @@ const Question = () => {
                       whiteSpace: 'pre-wrap'
                     }}>
                       {verdict.roadmap_vertices && `print(vertices)\n${JSON.stringify(verdict.roadmap_vertices, null, 2)}\n\n`}
-                      {verdict.roadmap_edges && `print(edges)\n${JSON.stringify(verdict.roadmap_edges, null, 2)}`}
+                      {roadmapEdges && `print(edges)\n${JSON.stringify(roadmapEdges, null, 2)}`}
                     </div>
                   </div>
                 </div>